@@ -0,0 +1,144 @@
+"""
+Compiler micro-benchmarks for SphinxCompiler.
+
+Measures compile throughput and allocated memory per compile for representative query shapes
+on every installed driver dialect, with MATCH text and OPTION values inlined and bound
+(bind_match_params=True).
+
+    python benchmarks/compile_benchmark.py                  # print results
+    python benchmarks/compile_benchmark.py --save           # store them as the baseline
+    python benchmarks/compile_benchmark.py --compare        # exit 1 when slower than the baseline
+"""
+
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import sys
+import timeit
+
+try:
+    import tracemalloc
+except ImportError:  # python 2, allocations are not measured
+    tracemalloc = None
+
+from sqlalchemy import create_engine, Column, Integer, String, func, distinct, or_, not_
+from sqlalchemy.exc import NoSuchModuleError
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import Session, deferred
+
+import sqlalchemy_sphinx  # noqa registers the dialects
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+DIALECTS = ("sphinx+mysqldb://", "sphinx+pymysql://", "sphinx+cymysql://")
+# result key prefix -> create_engine() arguments
+CONFIGURATIONS = (("", {}), ("bound ", {"bind_match_params": True}))
+
+Base = declarative_base()
+
+
+class MockSphinxModel(Base):
+    __tablename__ = "mock_table"
+    name = Column(String)
+    id = Column(Integer, primary_key=True)
+    country = Column(String)
+    group_by_dummy = deferred(Column(String))
+    max_matches = deferred(Column(String))
+    field_weights = deferred(Column(String))
+
+
+def shapes(session):
+    model = MockSphinxModel
+    base = session.query(model.id)
+    return {
+        "match_single": base.filter(model.name.match("adri'el @user (x)")),
+        "match_multi": base.filter(model.name.match("adriel"), model.country.match("US"), model.id == 1),
+        "match_negated_or": base.filter(func.match(not_(or_(model.name, model.country)), "US")),
+        "options_field_weights": base.filter(
+            model.name.match("adriel"),
+            func.options(model.max_matches == 1000, model.field_weights == ["name=10", "country=3"])
+        ),
+        "count_distinct": session.query(func.count(distinct(model.id))).group_by(model.group_by_dummy),
+        "group_order_limit": base.filter(model.name.match("adriel")).group_by(model.country).order_by(
+            model.country).limit(20).offset(40),
+        "large_in": base.filter(model.id.in_(list(range(1000)))),
+    }
+
+
+def measure(engine, statement, number):
+    compile_ = statement.compile
+    seconds = min(timeit.repeat(lambda: compile_(engine), number=number, repeat=5))
+    allocated = None
+    if tracemalloc is not None:
+        tracemalloc.start()
+        compile_(engine)
+        allocated = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return {"compiles_per_sec": number / seconds, "peak_bytes": allocated}
+
+
+def run(number):
+    results = {}
+    session = Session()
+    for url in DIALECTS:
+        for prefix, engine_kwargs in CONFIGURATIONS:
+            try:
+                engine = create_engine(url, **engine_kwargs)
+            except (ImportError, NoSuchModuleError):
+                print("skipping {0}, driver not installed".format(url), file=sys.stderr)
+                break
+            for name, query in sorted(shapes(session).items()):
+                results["{0} {1}{2}".format(url, prefix, name)] = measure(engine, query.statement, number)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for key, result in sorted(results.items()):
+        if key not in baseline:
+            continue
+        expected = baseline[key]
+        if result["compiles_per_sec"] < expected["compiles_per_sec"] * (1 - tolerance):
+            regressions.append("{0}: {1:.0f}/s, baseline {2:.0f}/s".format(
+                key, result["compiles_per_sec"], expected["compiles_per_sec"]))
+        if result["peak_bytes"] is None or expected["peak_bytes"] is None:
+            continue
+        if result["peak_bytes"] > expected["peak_bytes"] * (1 + tolerance):
+            regressions.append("{0}: {1} bytes, baseline {2} bytes".format(
+                key, result["peak_bytes"], expected["peak_bytes"]))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=500, help="compiles per timing run")
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--save", action="store_true", help="store the results as the new baseline")
+    parser.add_argument("--compare", action="store_true", help="fail when results regress against the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed relative regression")
+    args = parser.parse_args(argv)
+    if args.compare and not args.save and not os.path.exists(args.baseline):
+        print("No baseline at {0}, create one with --save (make benchmark-baseline)".format(args.baseline),
+              file=sys.stderr)
+        return 2
+
+    results = run(args.number)
+    for key, result in sorted(results.items()):
+        peak_bytes = result["peak_bytes"] if result["peak_bytes"] is not None else "n/a"
+        print("{0:<61} {1:>10.0f} compiles/s {2:>10} bytes".format(key, result["compiles_per_sec"], peak_bytes))
+
+    if args.save:
+        with open(args.baseline, "w") as baseline_file:
+            json.dump(results, baseline_file, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.baseline) as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.tolerance)
+        for regression in regressions:
+            print("REGRESSION " + regression, file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
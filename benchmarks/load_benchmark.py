@@ -0,0 +1,158 @@
+"""
+End-to-end load benchmark against an in-process fake searchd (or a real one with --host/--port).
+
+Runs a workload through create_engine('sphinx+<driver>://...') at the given concurrency and reports
+throughput and latency percentiles per dialect variant.
+
+    python benchmarks/load_benchmark.py --concurrency 16 --requests 2000 --latency 0.002
+    python benchmarks/load_benchmark.py --workload batch --drivers pymysql
+"""
+
+from __future__ import print_function
+
+import argparse
+import sys
+import threading
+import time
+
+from sqlalchemy import create_engine, Column, Integer, String, func
+from sqlalchemy.exc import NoSuchModuleError
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import sessionmaker
+
+import sqlalchemy_sphinx  # noqa registers the dialects
+from sqlalchemy_sphinx.batch import execute_batch
+from sqlalchemy_sphinx.pagination import paginate
+from sqlalchemy_sphinx.testing import FakeSearchd
+
+Base = declarative_base()
+
+
+class MockSphinxModel(Base):
+    __tablename__ = "mock_table"
+    id = Column(Integer, primary_key=True)
+    name = Column(String)
+    country = Column(String)
+
+
+def search_query(session, request):
+    return session.query(MockSphinxModel.id, MockSphinxModel.name).filter(
+        MockSphinxModel.name.match("term{0}".format(request % 100))
+    )
+
+
+def select_workload(engine, session, request):
+    search_query(session, request).limit(20).all()
+
+
+def paginate_workload(engine, session, request):
+    paginate(engine, search_query(session, request), page=request % 5 + 1, per_page=20)
+
+
+def batch_workload(engine, session, request):
+    query = session.query(MockSphinxModel.country, func.count("*").label("count")).filter(
+        MockSphinxModel.name.match("term{0}".format(request % 100)))
+    execute_batch(engine, [
+        search_query(session, request).limit(20),
+        query.group_by(MockSphinxModel.country),
+        query.group_by(MockSphinxModel.name),
+    ])
+
+
+WORKLOADS = {
+    "select": select_workload,
+    "paginate": paginate_workload,
+    "batch": batch_workload,
+}
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+def run(url, workload, concurrency, requests):
+    # batch and paginate workloads send their statements in one round trip
+    engine = create_engine(url, pool_size=concurrency, max_overflow=0, multi_statements=True)
+    Session = sessionmaker(bind=engine)
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    counter = iter(range(requests))
+
+    def worker():
+        session = Session()
+        while True:
+            with lock:
+                request = next(counter, None)
+            if request is None:
+                break
+            start = time.time()
+            try:
+                workload(engine, session, request)
+            except Exception as e:
+                with lock:
+                    errors.append(e)
+                continue
+            elapsed = time.time() - start
+            with lock:
+                latencies.append(elapsed)
+        session.close()
+
+    started = time.time()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duration = time.time() - started
+    engine.dispose()
+
+    latencies.sort()
+    return {
+        "throughput": len(latencies) / duration,
+        "p50": percentile(latencies, 0.50) * 1000,
+        "p95": percentile(latencies, 0.95) * 1000,
+        "p99": percentile(latencies, 0.99) * 1000,
+        "errors": len(errors),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--drivers", default="pymysql,mysqldb,cymysql")
+    parser.add_argument("--workload", choices=sorted(WORKLOADS), default="select")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.001, help="fake searchd latency per statement")
+    parser.add_argument("--rows", type=int, default=20, help="rows returned by the fake searchd")
+    parser.add_argument("--host", help="benchmark a real searchd instead of the fake one")
+    parser.add_argument("--port", type=int, default=9306)
+    args = parser.parse_args(argv)
+
+    server = None
+    host, port = args.host, args.port
+    if host is None:
+        server = FakeSearchd(rows=args.rows, latency=args.latency, record=False).start()
+        host, port = server.host, server.port
+
+    try:
+        for driver in args.drivers.split(","):
+            url = "sphinx+{0}://{1}:{2}".format(driver, host, port)
+            try:
+                result = run(url, WORKLOADS[args.workload], args.concurrency, args.requests)
+            except (ImportError, NoSuchModuleError):
+                print("skipping {0}, driver not installed".format(driver), file=sys.stderr)
+                continue
+            print("{0:<10} {1:<9} {2:>9.1f} req/s  p50 {3:>7.2f} ms  p95 {4:>7.2f} ms  p99 {5:>7.2f} ms  "
+                  "errors {6}".format(driver, args.workload, result["throughput"], result["p50"],
+                                      result["p95"], result["p99"], result["errors"]))
+    finally:
+        if server is not None:
+            server.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -35,8 +35,12 @@ setup(
     zip_safe=False,
     install_requires=[
         "sqlalchemy>=1.3.0; python_version == '2.7' or python_version >= '3.4'",
-        "sqlalchemy>=1.3.0; python_version < '2.7'"
+        "sqlalchemy>=1.3.0; python_version < '2.7'",
+        "futures; python_version < '3.0'"
     ],
+    extras_require={
+        "numpy": ["numpy"],
+    },
     tests_require=['tox'],
     entry_points={
      'sqlalchemy.dialects': [
@@ -0,0 +1,98 @@
+""" Typeahead on CALL KEYWORDS / CALL QSUGGEST behind a bounded in-process cache"""
+
+from sqlalchemy import util
+
+from sqlalchemy_sphinx.cache import MemoryBackend
+from sqlalchemy_sphinx.dialect import keywords, qsuggest
+from sqlalchemy_sphinx.utils import escape_match_param
+
+__all__ = ("Autocomplete", "keywords", "qsuggest")
+
+
+def normalize(text):
+    return u" ".join(text.lower().split())
+
+
+class Autocomplete(object):
+    """
+    Memoizing front for one index's CALL KEYWORDS and CALL QSUGGEST.
+
+    Results are cached by (procedure, index, normalized text, options) for ttl seconds, at most
+    max_size of them. complete() expands the last word of a prefix into the index's keywords;
+    when a shorter prefix's expansion was complete (fewer than expansion_limit keywords), longer
+    prefixes are answered by filtering it instead of asking searchd again.
+
+    Example:
+    autocomplete = Autocomplete(engine, "articles")
+    autocomplete.complete("sph")          # ["sphinx", "sphere", ...] most documents first
+    autocomplete.suggest("sphnix")        # rows of suggest, distance, docs
+    """
+
+    def __init__(self, bind, index, max_size=1024, ttl=60, expansion_limit=20, backend=None):
+        self.bind = bind
+        self.index = index
+        self.ttl = ttl
+        self.expansion_limit = expansion_limit
+        self.backend = backend if backend is not None else MemoryBackend(max_size)
+        self.hits = 0
+        self.misses = 0
+        # lookups answered from a shorter prefix's expansion
+        self.reused = 0
+
+    def invalidate(self):
+        self.backend.invalidate(self.index)
+
+    def _call(self, key, statement):
+        cached = self.backend.get(key)
+        if cached is not None:
+            self.hits += 1
+            return cached
+        self.misses += 1
+        result = self.bind.execute(statement)
+        row_class = util.lightweight_named_tuple("result", result.keys())
+        rows = [row_class(row) for row in result.fetchall()]
+        self.backend.set(key, rows, self.ttl, [self.index])
+        return rows
+
+    def keywords(self, text, **options):
+        """CALL KEYWORDS rows: qpos, tokenized, normalized[, docs, hits]"""
+        key = ("keywords", self.index, normalize(text), tuple(sorted(options.items())))
+        return self._call(key, keywords(text, self.index, **options))
+
+    def suggest(self, word, **options):
+        """CALL QSUGGEST rows: suggest, distance, docs"""
+        key = ("qsuggest", self.index, normalize(word), tuple(sorted(options.items())))
+        return self._call(key, qsuggest(word, self.index, **options))
+
+    def _expansion_key(self, prefix):
+        return ("complete", self.index, prefix, self.expansion_limit)
+
+    def _expand(self, prefix):
+        cached = self.backend.get(self._expansion_key(prefix))
+        if cached is not None:
+            self.hits += 1
+            return cached[0]
+        for length in range(len(prefix) - 1, 0, -1):
+            shorter = self.backend.get(self._expansion_key(prefix[:length]))
+            if shorter is not None and shorter[1]:
+                self.reused += 1
+                words = [word for word in shorter[0] if word.startswith(prefix)]
+                self.backend.set(self._expansion_key(prefix), (words, True), self.ttl, [self.index])
+                return words
+
+        self.misses += 1
+        statement = keywords(escape_match_param(prefix) + u"*", self.index, stats=True, fold_wildcards=False,
+                             expansion_limit=self.expansion_limit)
+        rows = sorted(self.bind.execute(statement).fetchall(), key=lambda row: -int(row.docs))
+        words = util.unique_list(row.normalized for row in rows)
+        complete = len(words) < self.expansion_limit
+        self.backend.set(self._expansion_key(prefix), (words, complete), self.ttl, [self.index])
+        return words
+
+    def complete(self, prefix, limit=None):
+        """Keywords of the index completing the last word of prefix, most documents first"""
+        word = normalize(prefix).rpartition(u" ")[2]
+        if not word:
+            return []
+        words = self._expand(word)
+        return words[:limit] if limit else list(words)
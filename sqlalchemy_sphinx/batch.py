@@ -0,0 +1,155 @@
+""" Multi-statement batches, several SphinxQL statements in one network round trip"""
+
+import re
+
+from sqlalchemy import exc
+from sqlalchemy import util
+
+__all__ = ("execute_batch", "execute_facets", "render_statement")
+
+STRING_LITERAL_RE = re.compile(r"'(?:[^'\\]|\\.)*'")
+FACET_RE = re.compile(r"\sFACET\s", re.I)
+
+
+def render_statement(dialect, dbapi_connection, statement):
+    """Compile a statement and inline its parameters using the driver's own escaping"""
+    statement = getattr(statement, "statement", statement)
+    return render_compiled(dialect, dbapi_connection, statement.compile(dialect=dialect))
+
+
+def render_compiled(dialect, dbapi_connection, compiled):
+    """Inline the parameters of an already compiled statement"""
+    params = compiled.construct_params()
+    processors = compiled._bind_processors
+
+    def literal(name):
+        value = params[name]
+        if name in processors:
+            value = processors[name](value)
+        return dialect.literal_value(dbapi_connection, value)
+
+    # always format, even without parameters, so escaped '%%' collapse back to '%'
+    if compiled.positional:
+        return compiled.string % tuple(literal(name) for name in compiled.positiontup)
+    return compiled.string % dict((name, literal(name)) for name in params)
+
+
+def _fetch_results(cursor):
+    """Every result left on a cursor, None for statements answered without a result set"""
+    results = []
+    while True:
+        if cursor.description is None:
+            results.append(None)
+        else:
+            keys = [description[0] for description in cursor.description]
+            row_class = util.lightweight_named_tuple("result", keys)
+            results.append([row_class(row) for row in cursor.fetchall()])
+        if not cursor.nextset():
+            break
+    return results
+
+
+def fetch_result_sets(cursor):
+    """Read every result set left on a cursor by a multi-statement execute"""
+    return [rows for rows in _fetch_results(cursor) if rows is not None]
+
+
+def _result_count(statement):
+    """Results searchd sends for one statement: one, plus one per FACET clause"""
+    return 1 + len(FACET_RE.findall(STRING_LITERAL_RE.sub("''", statement)))
+
+
+def _group_results(results, statements):
+    """Split the results of a multi-statement execute into the result sets of each statement"""
+    grouped = []
+    for statement in statements:
+        count = _result_count(statement)
+        grouped.append([rows for rows in results[:count] if rows is not None])
+        results = results[count:]
+    return grouped
+
+
+def execute_raw(bind, sql_text):
+    """
+    Send already rendered SphinxQL and return its result sets.
+
+    sql_text is one statement, giving the list of its result sets (none for UPDATE / REPLACE,
+    several with FACET clauses), or a list of statements, giving one such list per statement.
+    A list goes to searchd in one round trip when the engine was created with
+    multi_statements=True, otherwise one statement after the other on the same connection.
+    """
+    connection = bind.connect()
+    try:
+        dialect = connection.dialect
+        single = isinstance(sql_text, util.string_types)
+        statements = [sql_text] if single else list(sql_text)
+        cursor = connection.connection.cursor()
+        try:
+            if dialect.multi_statements and not single:
+                statement = ";\n".join(statements)
+                cursor.execute(statement)
+                results = _group_results(_fetch_results(cursor), statements)
+            else:
+                results = []
+                for statement in statements:
+                    cursor.execute(statement)
+                    results.append(fetch_result_sets(cursor))
+            return results[0] if single else results
+        except dialect.dbapi.Error as e:
+            util.raise_(
+                exc.DBAPIError.instance(statement, None, e, dialect.dbapi.Error),
+                from_=e
+            )
+        finally:
+            cursor.close()
+    finally:
+        connection.close()
+
+
+def execute_batch(bind, statements):
+    """
+    Execute several ORM queries / select() objects as one multi-statement packet.
+
+    searchd optimizes shared work between the statements of a batch (e.g. same MATCH
+    with different GROUP BY). Returns one list of rows per statement, in order: empty for
+    statements without a result set, (rows, [facet rows, ...]) for statements with FACET
+    clauses. Needs an engine created with multi_statements=True for the single round trip,
+    see execute_raw.
+
+    Example:
+    by_country, by_brand = execute_batch(engine, [
+        session.query(Model.country, func.count("*")).filter(Model.name.match("adriel")).group_by(Model.country),
+        session.query(Model.brand, func.count("*")).filter(Model.name.match("adriel")).group_by(Model.brand),
+    ])
+    """
+    connection = bind.connect()
+    try:
+        dbapi_connection = connection.connection
+        results = execute_raw(connection, [
+            render_statement(connection.dialect, dbapi_connection, statement)
+            for statement in statements
+        ])
+    finally:
+        connection.close()
+    return [_statement_rows(result_sets) for result_sets in results]
+
+
+def _statement_rows(result_sets):
+    if not result_sets:
+        return []
+    if len(result_sets) == 1:
+        return result_sets[0]
+    return result_sets[0], result_sets[1:]
+
+
+def execute_facets(bind, statement):
+    """
+    Execute a query carrying FACET clauses and return (rows, [facet rows, ...]).
+    """
+    connection = bind.connect()
+    try:
+        sql_text = render_statement(connection.dialect, connection.connection, statement)
+        results = execute_raw(connection, sql_text)
+    finally:
+        connection.close()
+    return results[0], results[1:]
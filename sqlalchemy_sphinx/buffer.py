@@ -0,0 +1,191 @@
+""" Write-behind buffering of RT index writes, coalesced per document and flushed in bulk"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import exc
+
+from sqlalchemy_sphinx.rt import CHUNK_SIZE, _id_key, _row_value, bulk_replace
+
+__all__ = ("WriteBehindBuffer",)
+
+log = logging.getLogger("sqlalchemy_sphinx.buffer")
+
+REPLACE = "replace"
+DELETE = "delete"
+
+
+class WriteBehindBuffer(object):
+    """
+    Collects REPLACE and DELETE writes per RT index and document id, keeping only the last
+    write of every id, and sends them as multi-row REPLACE and DELETE ... WHERE id IN (...)
+    statements from a background thread.
+
+    A flush starts once max_size documents are pending or interval seconds after the oldest
+    pending write. flush() sends everything pending from the calling thread. close() stops the
+    thread and flushes what is left; writes after that raise InvalidRequestError. A failed flush
+    puts its writes back under any newer ones and is retried on the next trigger.
+
+    Rows are dicts or model instances and are copied when they are buffered. depth, flushes,
+    flushed, coalesced, errors, last_flush_latency and max_flush_latency are kept for metrics.
+
+    Example:
+    with WriteBehindBuffer(engine, max_size=5000, interval=0.5) as buffer:
+        buffer.replace(RTModel, {"id": 1, "title": "sphinx"})
+        buffer.delete(RTModel, 2)
+    """
+
+    def __init__(self, bind, max_size=CHUNK_SIZE, interval=1.0, chunk_size=CHUNK_SIZE):
+        self.bind = bind
+        self.max_size = max_size
+        self.interval = interval
+        self.chunk_size = chunk_size
+        # index name -> OrderedDict of document id -> (REPLACE, row) or (DELETE, None)
+        self._pending = OrderedDict()
+        self._tables = {}
+        self._oldest = None
+        self._closed = False
+        self._condition = threading.Condition()
+        # flushes run one at a time so an older batch never overwrites a newer one
+        self._flush_lock = threading.Lock()
+
+        self.depth = 0
+        self.flushes = 0
+        self.flushed = 0
+        # writes replaced by a later write to the same document before being sent
+        self.coalesced = 0
+        self.errors = 0
+        self.last_flush_latency = None
+        self.max_flush_latency = 0.0
+
+        self._thread = threading.Thread(target=self._run, name="sphinx-write-behind")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _add(self, target, document_id, write):
+        table = getattr(target, "__table__", target)
+        with self._condition:
+            if self._closed:
+                raise exc.InvalidRequestError("WriteBehindBuffer is closed")
+            self._tables[table.name] = table
+            writes = self._pending.setdefault(table.name, OrderedDict())
+            if document_id in writes:
+                del writes[document_id]
+                self.coalesced += 1
+            else:
+                self.depth += 1
+            writes[document_id] = write
+            if self._oldest is None:
+                # wakes the thread to start the interval
+                self._oldest = time.time()
+                self._condition.notify()
+            elif self.depth >= self.max_size:
+                self._condition.notify()
+
+    def replace(self, target, row):
+        """Buffer a REPLACE of row, a dict or model instance holding every column of the index"""
+        table = getattr(target, "__table__", target)
+        values = dict((column.key, _row_value(row, column.key)) for column in table.columns)
+        self._add(table, values[_id_key(table)], (REPLACE, values))
+
+    def delete(self, target, document_id):
+        """Buffer a DELETE of the document with this id"""
+        self._add(target, document_id, (DELETE, None))
+
+    def _take(self):
+        with self._condition:
+            pending, self._pending = self._pending, OrderedDict()
+            self.depth = 0
+            self._oldest = None
+            return pending
+
+    def _restore(self, pending):
+        with self._condition:
+            for name, writes in pending.items():
+                newer = self._pending.get(name, OrderedDict())
+                merged = OrderedDict((key, write) for key, write in writes.items() if key not in newer)
+                merged.update(newer)
+                self.depth += len(merged) - len(newer)
+                self._pending[name] = merged
+            if self._oldest is None and self.depth:
+                self._oldest = time.time()
+            # the thread may be waiting without a timeout since the failed flush emptied the buffer
+            self._condition.notify()
+
+    def _write(self, pending):
+        connection = self.bind.connect()
+        try:
+            for name, writes in pending.items():
+                table = self._tables[name]
+                deleted = [key for key, (operation, _) in writes.items() if operation == DELETE]
+                rows = [row for operation, row in writes.values() if operation == REPLACE]
+                for position in range(0, len(deleted), self.chunk_size):
+                    connection.execute(table.delete().where(
+                        table.columns[_id_key(table)].in_(deleted[position:position + self.chunk_size])))
+                if rows:
+                    bulk_replace(connection, table, rows, chunk_size=self.chunk_size)
+        finally:
+            connection.close()
+
+    def flush(self):
+        """Send every pending write now, returns the number of documents written"""
+        with self._flush_lock:
+            pending = self._take()
+            count = sum(len(writes) for writes in pending.values())
+            if not count:
+                return 0
+            start = time.time()
+            try:
+                self._write(pending)
+            except Exception:
+                self.errors += 1
+                self._restore(pending)
+                raise
+            latency = time.time() - start
+            self.flushes += 1
+            self.flushed += count
+            self.last_flush_latency = latency
+            self.max_flush_latency = max(self.max_flush_latency, latency)
+            return count
+
+    def _due(self):
+        if not self.depth:
+            return None
+        if self.depth >= self.max_size:
+            return 0
+        return max(self._oldest + self.interval - time.time(), 0)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._closed:
+                    due = self._due()
+                    if due == 0:
+                        break
+                    self._condition.wait(due)
+                if self._closed:
+                    return
+            try:
+                self.flush()
+            except Exception:
+                log.exception("Write-behind flush failed, %d documents kept for the next one", self.depth)
+                # back off instead of retrying a failing searchd in a loop
+                with self._condition:
+                    if not self._closed:
+                        self._condition.wait(self.interval)
+
+    def close(self, timeout=None):
+        """Stop the background thread and flush the remaining writes"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join(timeout)
+        return self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,190 @@
+""" Result cache for SphinxQL SELECTs, keyed on the final statement text and parameters"""
+
+import threading
+import time
+from collections import OrderedDict
+
+__all__ = ("CacheBackend", "MemoryBackend", "ResultCache", "CachedCursor")
+
+
+class CacheBackend(object):
+    """Interface for result cache storage, values are (description, rows) tuples"""
+
+    def get(self, key):
+        raise NotImplementedError()
+
+    def set(self, key, value, ttl, indexes):
+        raise NotImplementedError()
+
+    def invalidate(self, index):
+        """Drop every entry that read from the given index"""
+        raise NotImplementedError()
+
+    def clear(self):
+        raise NotImplementedError()
+
+
+class MemoryBackend(CacheBackend):
+    """In-process LRU with per entry expiry"""
+
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.indexes = {}
+        self.lock = threading.Lock()
+
+    def _remove(self, key):
+        value, expires, indexes = self.entries.pop(key)
+        for index in indexes:
+            keys = self.indexes.get(index)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.indexes[index]
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] < time.time():
+                self._remove(key)
+                return None
+            # move to the most recently used end
+            del self.entries[key]
+            self.entries[key] = entry
+            return entry[0]
+
+    def set(self, key, value, ttl, indexes):
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = (value, time.time() + ttl, tuple(indexes))
+            for index in indexes:
+                self.indexes.setdefault(index, set()).add(key)
+            while len(self.entries) > self.max_size:
+                self._remove(next(iter(self.entries)))
+
+    def invalidate(self, index):
+        with self.lock:
+            for key in list(self.indexes.get(index, ())):
+                self._remove(key)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.indexes.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class CachedCursor(object):
+    """DBAPI cursor look-alike serving rows that were already fetched"""
+
+    def __init__(self, description, rows, rowcount=-1, hit=False):
+        self.description = description
+        self.rows = list(rows)
+        self.rowcount = rowcount if rowcount != -1 else len(self.rows)
+        self.lastrowid = None
+        self.position = 0
+        # True when served from the cache without reaching searchd
+        self.hit = hit
+
+    def fetchone(self):
+        if self.position >= len(self.rows):
+            return None
+        row = self.rows[self.position]
+        self.position += 1
+        return row
+
+    def fetchmany(self, size=None):
+        size = size or 1
+        rows = self.rows[self.position:self.position + size]
+        self.position += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self.rows[self.position:]
+        self.position = len(self.rows)
+        return rows
+
+    def nextset(self):
+        return None
+
+    def close(self):
+        pass
+
+
+def _freeze(parameters):
+    if isinstance(parameters, dict):
+        return tuple(sorted(parameters.items()))
+    return tuple(parameters or ())
+
+
+def _statement_indexes(statement):
+    table = getattr(statement, "table", None)
+    if table is not None:
+        return [table.name]
+    return [getattr(from_, "name", None) for from_ in getattr(statement, "froms", ())]
+
+
+class ResultCache(object):
+    """
+    Opt-in cache of SELECT results, passed to the engine with create_engine(..., result_cache=ResultCache()).
+
+    The key is the statement as sent to searchd plus its parameters, so OPTION clauses are part of it.
+    Per query the TTL can be changed with execution_options(sphinx_cache_ttl=seconds), or the cache
+    skipped with execution_options(sphinx_cache=False). Writes compiled through the engine
+    invalidate the entries of the index they write to.
+    """
+
+    def __init__(self, backend=None, ttl=60, max_size=1024):
+        self.backend = backend if backend is not None else MemoryBackend(max_size)
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        # the counters are updated from every thread executing through the engine
+        self.lock = threading.Lock()
+
+    def invalidate(self, index):
+        self.backend.invalidate(index)
+
+    def clear(self):
+        self.backend.clear()
+
+    def execute(self, execute, cursor, statement, parameters, context):
+        """Run execute() unless the result is cached, returns the cursor the result has to be read from"""
+        compiled = context.compiled
+        if compiled is None:
+            execute(cursor, statement, parameters, context)
+            return cursor
+
+        indexes = [index for index in _statement_indexes(compiled.statement) if index]
+        if context.isinsert or context.isupdate or context.isdelete:
+            execute(cursor, statement, parameters, context)
+            for index in indexes:
+                self.invalidate(index)
+            return cursor
+
+        options = context.execution_options
+        if not options.get("sphinx_cache", True) or not statement.lstrip()[:6].upper() == "SELECT":
+            execute(cursor, statement, parameters, context)
+            return cursor
+
+        key = (statement, _freeze(parameters))
+        cached = self.backend.get(key)
+        if cached is not None:
+            with self.lock:
+                self.hits += 1
+            cursor.close()
+            return CachedCursor(*cached, hit=True)
+
+        with self.lock:
+            self.misses += 1
+        execute(cursor, statement, parameters, context)
+        description = cursor.description
+        rows = tuple(cursor.fetchall()) if description is not None else ()
+        cursor.close()
+        self.backend.set(key, (description, rows), options.get("sphinx_cache_ttl", self.ttl), indexes)
+        return CachedCursor(description, rows)
@@ -0,0 +1,111 @@
+""" Columnar fetching, numeric result columns as contiguous typed arrays instead of rows"""
+
+import array
+import numbers
+import sys
+from collections import OrderedDict
+
+from sqlalchemy import exc
+from sqlalchemy import types as sqltypes
+from sqlalchemy import util
+
+from sqlalchemy_sphinx.batch import render_statement
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+__all__ = ("fetch_columns", "column_typecode")
+
+INT32 = "i"
+# python 2's array module has no 'q', 'l' is 64 bit on the LP64 platforms searchd runs on
+INT64 = "q" if sys.version_info >= (3, 3) else "l"
+FLOAT64 = "d"
+NUMPY_DTYPES = {INT32: "int32", INT64: "int64", FLOAT64: "float64"}
+
+
+def column_typecode(type_):
+    """array typecode for a column type, None when the column is not numeric"""
+    if isinstance(type_, sqltypes.SmallInteger):
+        return INT32
+    if isinstance(type_, sqltypes.Integer):
+        # searchd's uint attributes do not fit a signed 32 bit integer
+        return INT64
+    if isinstance(type_, sqltypes.Float):
+        return FLOAT64
+    return None
+
+
+def _infer_typecode(values):
+    """int64 when every value is an integer, float64 when some are floats, None otherwise"""
+    typecode = None
+    for value in values:
+        if isinstance(value, bool) or value is None:
+            return None
+        if isinstance(value, numbers.Integral):
+            typecode = typecode or INT64
+        elif isinstance(value, numbers.Real):
+            typecode = FLOAT64
+        else:
+            return None
+    return typecode
+
+
+def _statement_typecodes(statement, names):
+    columns = util.unique_list(getattr(statement, "inner_columns", ()))
+    if len(columns) != len(names):
+        return [None] * len(names)
+    return [column_typecode(column.type) for column in columns]
+
+
+def fetch_columns(bind, statement, use_numpy=None, typecodes=None):
+    """
+    Run a SELECT and return an OrderedDict of result column name -> column.
+
+    Integer, BigInteger and Float columns of the selected model attributes become numpy arrays
+    (array.array when numpy is not installed or use_numpy=False), untyped expressions such as
+    WEIGHT() are typed from their values. typecodes={"name": "d"} overrides the mapping, other
+    columns are returned as lists. Rows skip SQLAlchemy's result processing altogether.
+
+    Example:
+    columns = fetch_columns(engine, session.query(Model.id, func.weight().label("weight")).filter(...))
+    columns["id"], columns["weight"]
+    """
+    if use_numpy is None:
+        use_numpy = numpy is not None
+    elif use_numpy and numpy is None:
+        raise ImportError("fetch_columns(use_numpy=True) requires numpy")
+    statement = getattr(statement, "statement", statement)
+    connection = bind.connect()
+    try:
+        dialect = connection.dialect
+        sql_text = render_statement(dialect, connection.connection, statement)
+        cursor = connection.connection.cursor()
+        try:
+            cursor.execute(sql_text)
+            names = [description[0] for description in cursor.description]
+            rows = cursor.fetchall()
+        except dialect.dbapi.Error as e:
+            util.raise_(
+                exc.DBAPIError.instance(sql_text, None, e, dialect.dbapi.Error),
+                from_=e
+            )
+        finally:
+            cursor.close()
+    finally:
+        connection.close()
+
+    declared = _statement_typecodes(statement, names)
+    values = list(zip(*rows)) if rows else [()] * len(names)
+    typecodes = typecodes or {}
+    columns = OrderedDict()
+    for name, typecode, column in zip(names, declared, values):
+        typecode = typecodes.get(name, typecode) or _infer_typecode(column)
+        if typecode is None:
+            columns[name] = list(column)
+        elif use_numpy:
+            columns[name] = numpy.array(column, dtype=NUMPY_DTYPES.get(typecode, typecode))
+        else:
+            columns[name] = array.array(typecode, column)
+    return columns
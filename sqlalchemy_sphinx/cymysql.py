@@ -3,8 +3,6 @@
 from __future__ import absolute_import
 
 import cymysql
-from cymysql.connections import Connection
-from cymysql.converters import ESCAPE_REGEX, ESCAPE_MAP
 from sqlalchemy.dialects.mysql import cymysql as cymysql_dialect
 from sqlalchemy_sphinx.dialect import SphinxDialect
 
@@ -14,7 +12,8 @@ __all__ = ("Dialect",)
 class DBAPIShim(object):
 
     def connect(self, *args, **kwargs):
-        return Connection(*args, **kwargs)
+        # newer CyMySQL releases only open the socket in cymysql.connect, not in Connection()
+        return cymysql.connect(*args, **kwargs)
 
     def __getattr__(self, name):
         return getattr(cymysql, name)
@@ -45,10 +44,6 @@ class Dialect(SphinxDialect, cymysql_dialect.MySQLDialect_cymysql):
     def get_isolation_level(self, connection):
         pass
 
-    def escape_value(self, value):
-        """cymysql.escape_string without quotes"""
-        return "%s" % ESCAPE_REGEX.sub(lambda match: ESCAPE_MAP.get(match.group(0)), value)
-
     @classmethod
     def dbapi(cls):
         return DBAPIShim()
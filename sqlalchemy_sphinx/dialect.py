@@ -1,27 +1,151 @@
 """ Dialect implementaiton for SphinxQL based on MySQLdb-Python protocol"""
 
 import operator
+import re
+import time
+from collections import OrderedDict
 
+from sqlalchemy import event
 from sqlalchemy.engine import default
-from sqlalchemy.exc import CompileError
+from sqlalchemy.exc import ArgumentError, CompileError, DisconnectionError
 from sqlalchemy.sql import compiler
 from sqlalchemy.sql import expression as sql
-from sqlalchemy.sql.functions import Function
+from sqlalchemy.sql.functions import Function, GenericFunction
 from sqlalchemy.sql.elements import (
     ClauseList, UnaryExpression, BooleanClauseList, Grouping,
-    ColumnClause, BindParameter
+    ColumnClause, BindParameter, BinaryExpression
 )
 
-from sqlalchemy.types import MatchType
+from sqlalchemy.types import MatchType, String
 from sqlalchemy import util
 
-from sqlalchemy_sphinx.utils import escape_special_chars, escape_percent_char
+from sqlalchemy_sphinx.replicas import ReplicaRouter, parse_hosts
+from sqlalchemy_sphinx.utils import MAX_MATCHES, escape_string, escape_match_text, escape_match_term, escape_match_param
+
+__all__ = ("SphinxDialect", "facet", "snippets", "keywords", "qsuggest")
 
-__all__ = ("SphinxDialect")
+OPTION_NAME_RE = re.compile(r"^[A-Za-z_]+$")
+WEIGHT_RE = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*=[0-9]+$")
+RANKERS = frozenset(("proximity_bm25", "bm25", "none", "wordcount", "proximity", "matchany", "fieldmask",
+                     "sph04"))
+
+
+class facet(GenericFunction):
+    """
+    FACET clause (Sphinx 2.3+ / Manticore). All facets are computed from the same match pass
+    and returned as additional result sets after the main one.
+
+    Example:
+    query.filter(facet(Model.country, order_by=func.count("*").desc(), limit=10))
+    SELECT id FROM test WHERE MATCH('adriel') FACET country ORDER BY count(*) DESC LIMIT 10
+    """
+    name = "facet"
+    _register = False
+
+    def __init__(self, *args, **kwargs):
+        self.order_by = kwargs.pop("order_by", None)
+        self.limit = kwargs.pop("limit", None)
+        super(facet, self).__init__(*args, **kwargs)
+
+
+class CallStatement(sql.Executable, sql.ClauseElement):
+    """CALL <procedure>(<arguments>, <value> AS <option>, ...) for searchd's built in procedures"""
+    __visit_name__ = "sphinx_call"
+    _execution_options = sql.Executable._execution_options.union({"autocommit": False})
+    procedure = None
+
+    def __init__(self, arguments, options):
+        self.arguments = arguments
+        self.options = []
+        for name, value in sorted(options.items()):
+            if not OPTION_NAME_RE.match(name):
+                raise ArgumentError("Invalid CALL {0} option name {1!r}".format(self.procedure, name))
+            if isinstance(value, bool):
+                value = int(value)
+            self.options.append((name, sql.bindparam("call_option", value, unique=True)))
+
+    @staticmethod
+    def _text(name, value):
+        return sql.bindparam(name, value, type_=String(), unique=True)
+
+
+class snippets(CallStatement):
+    """
+    CALL SNIPPETS for several documents in one statement, returning one 'snippet' row per document.
+
+    The query is highlighting text in Sphinx query syntax, exact=True escapes its operators
+    the way column MATCH terms are. Documents, query and option values are bound parameters.
+
+    Example:
+    engine.execute(snippets(["first document", "second"], "articles", "sphinx", limit=80, before_match="<b>"))
+    CALL SNIPPETS((%s, %s), %s, %s, %s AS before_match, %s AS limit)
+    """
+    procedure = "SNIPPETS"
+
+    def __init__(self, documents, index, query, exact=False, **options):
+        if not documents:
+            raise ArgumentError("CALL SNIPPETS needs at least one document")
+        if exact:
+            query = escape_match_param(query)
+        documents = sql.tuple_(*[self._text("snippet_document", document) for document in documents]).self_group()
+        super(snippets, self).__init__(
+            [documents, self._text("snippet_index", index), self._text("snippet_query", query)], options)
+
+
+class keywords(CallStatement):
+    """
+    CALL KEYWORDS, how searchd tokenizes and normalizes text, with per keyword statistics
+    when called with stats=True. Rows are qpos, tokenized, normalized[, docs, hits].
+
+    Example:
+    engine.execute(keywords("sphinx searching", "articles", stats=True))
+    CALL KEYWORDS(%s, %s, %s AS stats)
+    """
+    procedure = "KEYWORDS"
+
+    def __init__(self, text, index, **options):
+        super(keywords, self).__init__([self._text("keywords_text", text), self._text("keywords_index", index)],
+                                       options)
+
+
+class qsuggest(CallStatement):
+    """
+    CALL QSUGGEST (Manticore), spelling suggestions for a word. Rows are suggest, distance, docs.
+
+    Example:
+    engine.execute(qsuggest("sphnix", "articles", limit=5))
+    CALL QSUGGEST(%s, %s, %s AS limit)
+    """
+    procedure = "QSUGGEST"
+
+    def __init__(self, word, index, **options):
+        super(qsuggest, self).__init__([self._text("qsuggest_word", word), self._text("qsuggest_index", index)],
+                                       options)
 
 
 class SphinxCompiler(compiler.SQLCompiler):
 
+    def __init__(self, dialect, statement, *args, **kwargs):
+        # QueryTemplate compiles with bound MATCH text whatever the engine's setting
+        bind_match_params = kwargs.pop("bind_match_params", None)
+        self.bind_match_params = dialect.bind_match_params if bind_match_params is None else bind_match_params
+        # per-compile MATCH / OPTION state, populated while visiting the statement
+        self.left_match = tuple()
+        self.right_match = tuple()
+        self.match_operators = tuple()
+        self.match_binds = {}
+        self.options_list = []
+        self.facets = []
+        # OPTION values of the top level SELECT after merging with the engine defaults
+        self.sphinx_options = {}
+        super(SphinxCompiler, self).__init__(dialect, statement, *args, **kwargs)
+
+    def construct_params(self, params=None, _group_number=None, _check=True):
+        pd = super(SphinxCompiler, self).construct_params(params, _group_number, _check)
+        for name, terms in self.match_binds.items():
+            pd[name] = self._compose_match(terms, params)
+        return pd
+
     def visit_count_func(self, fn, *args, **_kw):
         "sphinxQL does not support other forms of count"
         if 'DISTINCT' in str(fn.clause_expr):
@@ -48,20 +172,88 @@ class SphinxCompiler(compiler.SQLCompiler):
         SELECT * FROM test WHERE MATCH('@title hello @body world')
         OPTION ranker=bm25, max_matches=3000, field_weights=(title=10, body=3)
         """
+        # rendered at the end of visit_select so bound values keep their position
+        self.options_list.extend(fn.clauses.clauses)
+
+    def _merge_options(self, select):
+        """
+        OPTION name -> explicit clause or plain value of the top level SELECT, lowest to highest
+        precedence: engine default_options, max_matches derived from LIMIT, the statement's
+        sphinx_options execution option, func.options(...). Later duplicates replace earlier ones.
+        """
+        options = OrderedDict()
+        for name, value in sorted(self.dialect.default_options.items()):
+            options[name] = value
+        if self.dialect.derive_max_matches and select._simple_int_limit and \
+                (select._offset_clause is None or select._simple_int_offset) and \
+                not select._group_by_clause.clauses:
+            # only ever raise max_matches: a lower one makes counts and groups approximate
+            derived = (select._offset or 0) + select._limit
+            if derived > self.dialect.default_options.get("max_matches", MAX_MATCHES):
+                options["max_matches"] = derived
+        for name, value in sorted(select._execution_options.get("sphinx_options", {}).items()):
+            options[name] = value
+        for clause in self.options_list:
+            if not isinstance(clause, BinaryExpression) or clause.operator is not operator.eq or \
+                    not isinstance(clause.right, BindParameter) or not hasattr(clause.left, "name"):
+                raise CompileError("Invalid OPTION clause, expected <option name> == <value>.")
+            options[clause.left.name] = clause
+        return options
+
+    def _check_option(self, name, value):
+        """Only names, integers, known rankers and weight lists may reach the OPTION clause"""
+        if not isinstance(name, util.string_types) or not OPTION_NAME_RE.match(name):
+            raise CompileError("Invalid OPTION name {0!r}.".format(name))
+        if name in ("field_weights", "index_weights"):
+            if not isinstance(value, (list, tuple)) or \
+                    not all(isinstance(weight, util.string_types) and WEIGHT_RE.match(weight) for weight in value):
+                raise CompileError("Invalid OPTION {0}, expected a list of 'name=<int>' strings.".format(name))
+        elif name == "ranker":
+            if value not in RANKERS:
+                raise CompileError("Invalid OPTION ranker {0!r}.".format(value))
+        elif isinstance(value, bool) or not isinstance(value, util.int_types):
+            raise CompileError("Invalid OPTION {0}={1!r}, expected an integer.".format(name, value))
+
+    def _render_options(self, options):
         options_list = []
-        for clause in fn.clauses.clauses:
-            if clause.left.name in ["field_weights", "index_weights"]:
+        for name, clause in options.items():
+            explicit = isinstance(clause, BinaryExpression)
+            value = clause.right.value if explicit else clause
+            self._check_option(name, value)
+            self.sphinx_options[name] = value
+            if name in ["field_weights", "index_weights"]:
                 option = "{0}=({1})"
-                option = option.format(clause.left.name, ", ".join(clause.right.value))
-                options_list.append(option)
+                option = option.format(name, ", ".join(value))
+            elif explicit and self.bind_match_params and isinstance(value, util.int_types):
+                option = "{0}={1}"
+                option = option.format(name, self.process(clause.right))
             else:
                 option = "{0}={1}"
-                option = option.format(clause.left.name, clause.right.value)
-                options_list.append(option)
-        self.options_list = options_list
-        # return "OPTION {}".format(", ".join(options_list))
+                option = option.format(name, value)
+            options_list.append(option)
+        return " OPTION {0}".format(", ".join(options_list))
+
+    def visit_facet_func(self, fn, *args, **_kw):
+        # rendered after OPTION at the end of visit_select
+        self.facets.append(fn)
+
+    def _render_facet(self, fn):
+        text = " FACET {0}".format(", ".join(self.process(clause) for clause in fn.clauses.clauses))
+        order_by = getattr(fn, "order_by", None)
+        if order_by is not None:
+            if not isinstance(order_by, (list, tuple)):
+                order_by = [order_by]
+            text += " ORDER BY {0}".format(", ".join(self.process(clause) for clause in order_by))
+        limit = getattr(fn, "limit", None)
+        if limit is not None:
+            text += " LIMIT {0}".format(int(limit))
+        return text
 
     def limit_clause(self, select, **kw):
+        if not select._simple_int_limit or select._offset_clause is not None and not select._simple_int_offset:
+            # bound LIMIT / OFFSET, e.g. the slots of a QueryTemplate
+            offset = select._offset_clause if select._offset_clause is not None else sql.literal(0)
+            return "\n LIMIT {0}, {1}".format(self.process(offset, **kw), self.process(select._limit_clause, **kw))
         text = ""
         if select._limit is not None and select._offset is None:
             text += "\n LIMIT 0, {0}".format(select._limit)
@@ -117,39 +309,108 @@ class SphinxCompiler(compiler.SQLCompiler):
 
         return columns
 
+    def _pop_match_terms(self):
+        terms = []
+        for left, right in zip(self.left_match, self.right_match):
+            if left is not None:
+                left = self._process_match(left)
+            terms.append((left, right))
+        self.left_match = tuple()
+        self.right_match = tuple()
+        return terms
+
+    def _render_match(self):
+        terms = self._pop_match_terms()
+        if self.bind_match_params:
+            # the search text is composed in construct_params, so the compiled
+            # string only depends on the shape of the query
+            bind = sql.bindparam("match", None, type_=String(), unique=True)
+            text = self.process(bind)
+            self.match_binds[self.bind_names[bind]] = terms
+            return u"MATCH({0})".format(text)
+
+        match_terms = []
+        for left, right in terms:
+            if left is None:
+                t = escape_match_text(right.value)
+            else:
+                t = u"(@{0} {1})".format(left, escape_match_term(right.value))
+            match_terms.append(t)
+        return u"MATCH('{0}')".format(u" ".join(match_terms))
+
+    def _compose_match(self, terms, params=None):
+        match_terms = []
+        for left, right in terms:
+            if params and right.key in params:
+                value = params[right.key]
+            else:
+                value = right.effective_value
+            if left is None:
+                match_terms.append(value)
+            else:
+                match_terms.append(u"(@{0} {1})".format(left, escape_match_param(value)))
+        return u" ".join(match_terms)
+
     def visit_match_op_binary(self, binary, operator, **kw):
         if self.left_match and self.right_match:
-            match_terms = []
-            for left, right in zip(self.left_match, self.right_match):
-                t = u"(@{0} {1})".format(
-                    self._process_match(left),
-                    escape_special_chars(self.dialect.escape_value(right.value)))
-                match_terms.append(t)
-            self.left_match = tuple()
-            self.right_match = tuple()
-            return u"MATCH('{0}')".format(u" ".join(match_terms))
+            return self._render_match()
 
     def visit_match_func(self, fn, **kw):
         '''
         Overwrite the top level match func since Sphinx does match differently
         '''
         if self.left_match and self.right_match:
-            match_terms = []
-            for left, right in zip(self.left_match, self.right_match):
-                if left is None:
-                    t = u"{0}".format(escape_percent_char(self.dialect.escape_value(right.value)))
-                else:
-                    t = u"(@{0} {1})".format(
-                        self._process_match(left),
-                        escape_special_chars(self.dialect.escape_value(right.value)))
-                match_terms.append(t)
-            self.left_match = tuple()
-            self.right_match = tuple()
-            return u"MATCH('{0}')".format(u" ".join(match_terms))
+            return self._render_match()
+
+    def visit_sphinx_call(self, call, **kw):
+        arguments = [self.process(argument, **kw) for argument in call.arguments]
+        arguments.extend("{0} AS {1}".format(self.process(value, **kw), name) for name, value in call.options)
+        return "CALL {0}({1})".format(call.procedure, ", ".join(arguments))
+
+    def visit_insert(self, insert_stmt, **kw):
+        text = super(SphinxCompiler, self).visit_insert(insert_stmt, **kw)
+        if insert_stmt.dialect_options["sphinx"]["replace"]:
+            text = "REPLACE" + text[len("INSERT"):]
+        return text
 
     def visit_distinct_func(self, func, **kw):
         return "DISTINCT {0}".format(self.process(func.clauses.clauses[0]))
 
+    def _check_match_clause(self, clause):
+        def ensure_right_correct(expr):
+            if not isinstance(expr, (str, BindParameter)):
+                raise CompileError("Invalid argument type for MATCH clause")
+
+        left_tuple = []
+        right_tuple = []
+        match_operators = []
+        if isinstance(clause.type, MatchType):
+            left_tuple.append(clause.left)
+            ensure_right_correct(clause.right)
+            right_tuple.append(clause.right)
+            match_operators.append(clause.operator)
+        elif isinstance(clause, Function):
+            if clause.name.lower() == "match":
+                if len(clause.clauses) == 2:
+                    func_left, func_right = clause.clauses
+                elif len(clause.clauses) == 1:
+                    func_left = None
+                    func_right, = clause.clauses
+                else:
+                    raise CompileError("Invalid arguments count for MATCH clause")
+
+                ensure_right_correct(func_right)
+
+                left_tuple.append(func_left)
+                right_tuple.append(func_right)
+        elif isinstance(clause, ClauseList):
+            for xclause in clause.clauses:
+                l, r, m = self._check_match_clause(xclause)
+                left_tuple.extend(l)
+                right_tuple.extend(r)
+                match_operators.extend(m)
+        return left_tuple, right_tuple, match_operators
+
     def visit_select(self, select,
                      asfrom=False, parens=True, iswrapper=False,
                      fromhints=None, compound_index=1, force_result_map=False,
@@ -192,47 +453,12 @@ class SphinxCompiler(compiler.SQLCompiler):
                                                 asfrom=True, **kwargs)
                            for f in froms])
 
-        def check_match_clause(clause):
-            def ensure_right_correct(expr):
-                if not isinstance(expr, (str, BindParameter)):
-                    raise CompileError("Invalid argument type for MATCH clause")
-
-            left_tuple = []
-            right_tuple = []
-            match_operators = []
-            if isinstance(clause.type, MatchType):
-                left_tuple.append(clause.left)
-                ensure_right_correct(clause.right)
-                right_tuple.append(clause.right)
-                match_operators.append(clause.operator)
-            elif isinstance(clause, Function):
-                if clause.name.lower() == "match":
-                    if len(clause.clauses) == 2:
-                        func_left, func_right = clause.clauses
-                    elif len(clause.clauses) == 1:
-                        func_left = None
-                        func_right, = clause.clauses
-                    else:
-                        raise CompileError("Invalid arguments count for MATCH clause")
-
-                    ensure_right_correct(func_right)
-
-                    left_tuple.append(func_left)
-                    right_tuple.append(func_right)
-            elif isinstance(clause, ClauseList):
-                for xclause in clause.clauses:
-                    l, r, m = check_match_clause(xclause)
-                    left_tuple.extend(l)
-                    right_tuple.extend(r)
-                    match_operators.extend(m)
-            return left_tuple, right_tuple, match_operators
-
         if select._whereclause is not None:
             # Match Clauses must be done in the same compiler
             left_tuple = []
             right_tuple = []
             match_operators = []
-            l, r, m = check_match_clause(select._whereclause)
+            l, r, m = self._check_match_clause(select._whereclause)
             left_tuple.extend(l)
             right_tuple.extend(r)
             match_operators.extend(m)
@@ -253,13 +479,16 @@ class SphinxCompiler(compiler.SQLCompiler):
 
         if select._order_by_clause.clauses:
             text += self.order_by_clause(select, **kwargs)
-        if select._limit is not None:
+        if select._limit_clause is not None:
             text += self.limit_clause(select)
 
-        if hasattr(self, "options_list"):
-            if self.options_list:
-                option_text = " OPTION {0}".format(", ".join(self.options_list))
-                text += option_text
+        # OPTION and FACET end the whole statement, including those given inside subqueries
+        if len(self.stack) == 1:
+            options = self._merge_options(select)
+            if options:
+                text += self._render_options(options)
+            for fn in self.facets:
+                text += self._render_facet(fn)
 
         self.stack.pop(-1)
         return text
@@ -270,14 +499,144 @@ class SphinxDialect(default.DefaultDialect):
     name = "sphinx"
     statement_compiler = SphinxCompiler
 
+    # table.insert(sphinx_replace=True) renders REPLACE INTO for RT indexes
+    construct_arguments = [
+        (sql.Insert, {"replace": False}),
+    ]
+
     # TODO HACK : Prevent SQLalchemy to send the request
     # 'SELECT 'X' as some_label;' as it is not supported by Sphinx
     description_encoding = None
 
+    def __init__(self, bind_match_params=False, result_cache=None, instrumentation=None,
+                 default_options=None, derive_max_matches=False, profiler=None, multi_statements=False, **kwargs):
+        super(SphinxDialect, self).__init__(**kwargs)
+        # render MATCH text and OPTION values as bound parameters; the compiled
+        # SphinxQL then only depends on the query shape and can be reused through compiled_cache
+        self.bind_match_params = bind_match_params
+        # optional sqlalchemy_sphinx.cache.ResultCache
+        self.result_cache = result_cache
+        # optional sqlalchemy_sphinx.instrumentation.Instrumentation
+        self.instrumentation = instrumentation
+        # OPTION values added to every top level SELECT, e.g. {"max_query_time": 500, "cutoff": 10000}
+        self.default_options = dict(default_options or {})
+        # render OPTION max_matches=<offset + limit> when the query has a LIMIT
+        self.derive_max_matches = derive_max_matches
+        # optional sqlalchemy_sphinx.profiling.Profiler
+        self.profiler = profiler
+        # let the connections send several ';' separated statements at once, see sqlalchemy_sphinx.batch
+        self.multi_statements = multi_statements
+
     def _get_default_schema_name(self, connection):
         """Prevent 'SELECT DATABASE()' being executed"""
         return None
 
+    # set when the URL lists several replicas, see sqlalchemy_sphinx.replicas
+    replica_router = None
+
+    def create_connect_args(self, url):
+        """Read FACET's extra result sets; multi-statement batches only with multi_statements=True"""
+        args, opts = super(SphinxDialect, self).create_connect_args(url)
+        replicas = parse_hosts(url)
+        if replicas:
+            self.replica_router = ReplicaRouter(replicas)
+            for key in ("host", "port", "hosts"):
+                opts.pop(key, None)
+        if self.dbapi is not None:
+            try:
+                CLIENT_FLAGS = __import__(self.dbapi.__name__ + ".constants.CLIENT").constants.CLIENT
+            except (AttributeError, ImportError):
+                return args, opts
+            client_flag = opts.get("client_flag", 0) | CLIENT_FLAGS.MULTI_RESULTS
+            if self.multi_statements:
+                client_flag |= CLIENT_FLAGS.MULTI_STATEMENTS
+            opts["client_flag"] = client_flag
+        return args, opts
+
+    @classmethod
+    def engine_created(cls, engine):
+        if engine.dialect.replica_router is not None:
+            event.listen(engine.pool, "checkout", engine.dialect._route_checkout)
+        if engine.dialect.instrumentation is not None:
+            event.listen(engine, "before_execute", engine.dialect.instrumentation.before_execute)
+        if engine.dialect.profiler is not None:
+            event.listen(engine, "after_execute", engine.dialect.profiler.after_execute)
+
+    def _route_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        """Replace pooled connections to ejected or comparatively slow replicas"""
+        replica = getattr(dbapi_connection, "sphinx_replica", None)
+        if replica is not None and self.replica_router.should_move(replica):
+            raise DisconnectionError("Moving away from replica {0}:{1}".format(*replica))
+
+    def connect(self, *cargs, **cparams):
+        if self.replica_router is None:
+            return super(SphinxDialect, self).connect(*cargs, **cparams)
+        error = None
+        for replica in self.replica_router.candidates():
+            host, port = replica
+            start = time.time()
+            try:
+                connection = super(SphinxDialect, self).connect(*cargs, **dict(cparams, host=host, port=port))
+            except self.dbapi.Error as e:
+                self.replica_router.eject(replica)
+                error = e
+                continue
+            self.replica_router.observe_connect(replica, time.time() - start)
+            connection.sphinx_replica = replica
+            return connection
+        raise error
+
+    def _timed_execute(self, execute, cursor, *args):
+        replica = getattr(cursor.connection, "sphinx_replica", None)
+        if replica is None:
+            return execute(cursor, *args)
+        start = time.time()
+        try:
+            execute(cursor, *args)
+        except self.dbapi.OperationalError:
+            self.replica_router.eject(replica)
+            raise
+        self.replica_router.observe(replica, time.time() - start)
+
+    def _do_execute(self, cursor, statement, parameters, context=None):
+        self._timed_execute(super(SphinxDialect, self).do_execute, cursor, statement, parameters, context)
+
+    def _profiled_execute(self, cursor, statement, parameters, context):
+        if self.profiler is not None and self.profiler.should_profile(statement, context):
+            self.profiler.execute(self._do_execute, cursor, statement, parameters, context)
+        else:
+            self._do_execute(cursor, statement, parameters, context)
+
+    def _cached_execute(self, cursor, statement, parameters, context):
+        if self.result_cache is None:
+            self._profiled_execute(cursor, statement, parameters, context)
+            return cursor
+        return self.result_cache.execute(self._profiled_execute, cursor, statement, parameters, context)
+
+    def do_execute(self, cursor, statement, parameters, context=None):
+        if context is None:
+            self._do_execute(cursor, statement, parameters, context)
+        elif self.instrumentation is not None:
+            context.cursor = self.instrumentation.execute(self._cached_execute, cursor, statement, parameters, context)
+        elif self.result_cache is not None:
+            context.cursor = self._cached_execute(cursor, statement, parameters, context)
+        else:
+            self._profiled_execute(cursor, statement, parameters, context)
+
+    def do_execute_no_params(self, cursor, statement, context=None):
+        self._timed_execute(super(SphinxDialect, self).do_execute_no_params, cursor, statement, context)
+
+    def escape_value(self, value):
+        """Escape a string for a SphinxQL string literal, the same way for every driver"""
+        return escape_string(value)
+
+    def literal_value(self, dbapi_connection, value):
+        """Render a python value as a SphinxQL literal using the driver's escaping"""
+        value = dbapi_connection.literal(value)
+        if isinstance(value, bytes):
+            value = value.decode("utf8")
+        return value
+
     def _check_unicode_returns(self, connection):
         return True
 
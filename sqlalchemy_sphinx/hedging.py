@@ -0,0 +1,190 @@
+""" Hedged reads: the same query sent to a second replica when the first one is slow to answer"""
+
+import collections
+import socket
+import threading
+import time
+from concurrent import futures
+
+from sqlalchemy import create_engine, exc
+
+from sqlalchemy_sphinx.batch import execute_raw, render_compiled
+from sqlalchemy_sphinx.replicas import ReplicaRouter
+
+__all__ = ("HedgedSearch",)
+
+# delay used until enough latencies were observed to derive one
+DEFAULT_DELAY = 0.05
+MIN_SAMPLES = 20
+
+
+class _Attempt(object):
+    """One replica's execution of a hedged query, interruptible from another thread"""
+
+    def __init__(self, url, engine):
+        self.url = url
+        self.engine = engine
+        self.dbapi_connection = None
+        self.running = False
+        self.cancelled = False
+        # set once a worker picked the attempt up, the hedge delay is counted from there
+        self.started = threading.Event()
+        self.lock = threading.Lock()
+
+
+class HedgedSearch(object):
+    """
+    Send a read to the fastest replica and, when it has not answered after delay seconds, the
+    same SphinxQL to the next one; whichever answers first wins and the other is cancelled.
+
+    delay is a fixed number of seconds, or None to use the percentile of the latencies observed
+    over the last window queries. Hedges are limited by a budget: every query earns budget hedge
+    tokens (0.1 allows hedging one query in ten on average) and every hedge spends one. The
+    losing query is cancelled by shutting its socket down (cancel="close") or with KILL from a
+    separate connection (cancel="kill"); drivers without an accessible socket always use KILL.
+
+    Example:
+    replicas = HedgedSearch(["sphinx://h1:9306", "sphinx://h2:9306"], delay=None, budget=0.05)
+    rows = replicas.execute(query.limit(20))
+    replicas.hedges_sent, replicas.hedges_won
+    """
+
+    def __init__(self, urls, delay=None, percentile=0.95, window=1000, budget=0.1, max_tokens=10.0,
+                 cancel="close", max_workers=None, **engine_kwargs):
+        if len(urls) < 2:
+            raise exc.ArgumentError("HedgedSearch needs at least two replicas")
+        if cancel not in ("close", "kill"):
+            raise exc.ArgumentError("cancel has to be 'close' or 'kill'")
+        self.urls = list(urls)
+        self.engines = dict((url, create_engine(url, **engine_kwargs)) for url in self.urls)
+        self.router = ReplicaRouter(self.urls)
+        self.delay = delay
+        self.percentile = percentile
+        self.latencies = collections.deque(maxlen=window)
+        self.budget = budget
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+        self.cancel = cancel
+        self.requests = 0
+        self.hedges_sent = 0
+        self.hedges_won = 0
+        # hedges that were due but not sent because the budget was spent
+        self.hedges_skipped = 0
+        self.lock = threading.Lock()
+        self.executor = futures.ThreadPoolExecutor(max_workers=max_workers or 2 * len(self.urls))
+
+    def hedge_delay(self):
+        if self.delay is not None:
+            return self.delay
+        with self.lock:
+            latencies = sorted(self.latencies)
+        if len(latencies) < MIN_SAMPLES:
+            return DEFAULT_DELAY
+        return latencies[min(int(len(latencies) * self.percentile), len(latencies) - 1)]
+
+    def _take_token(self):
+        with self.lock:
+            if self.tokens < 1:
+                self.hedges_skipped += 1
+                return False
+            self.tokens -= 1
+            self.hedges_sent += 1
+            return True
+
+    def _search(self, attempt, compiled):
+        attempt.started.set()
+        connection = attempt.engine.connect()
+        try:
+            with attempt.lock:
+                if attempt.cancelled:
+                    raise futures.CancelledError()
+                attempt.dbapi_connection = connection.connection.connection
+                attempt.running = True
+            sql_text = render_compiled(connection.dialect, connection.connection, compiled)
+            start = time.time()
+            try:
+                rows = execute_raw(connection, sql_text)[0]
+            finally:
+                with attempt.lock:
+                    attempt.running = False
+                    cancelled = attempt.cancelled
+            if cancelled:
+                # the socket may have been shut down after the rows arrived
+                connection.invalidate()
+                raise futures.CancelledError()
+            elapsed = time.time() - start
+            self.router.observe(attempt.url, elapsed)
+            with self.lock:
+                self.latencies.append(elapsed)
+            return rows
+        except exc.DBAPIError as e:
+            if attempt.cancelled:
+                connection.invalidate()
+                raise futures.CancelledError()
+            # a query error says nothing about the replica, only lost connections eject it
+            if isinstance(e, exc.OperationalError) or e.connection_invalidated:
+                self.router.eject(attempt.url)
+            raise
+        finally:
+            connection.close()
+
+    def _kill(self, engine, thread_id):
+        connection = engine.connect()
+        try:
+            execute_raw(connection, "KILL {0}".format(int(thread_id)))
+        finally:
+            connection.close()
+
+    def _cancel(self, attempt):
+        with attempt.lock:
+            attempt.cancelled = True
+            if not attempt.running:
+                return
+            sock = getattr(attempt.dbapi_connection, "_sock", None)
+            if self.cancel == "close" and sock is not None:
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except (IOError, OSError):
+                    pass
+                return
+            thread_id = attempt.dbapi_connection.thread_id()
+        self.executor.submit(self._kill, attempt.engine, thread_id)
+
+    def execute(self, query):
+        """Rows of the first replica to answer"""
+        statement = getattr(query, "statement", query)
+        replicas = self.router.candidates()
+        compiled = statement.compile(dialect=self.engines[replicas[0]].dialect)
+        with self.lock:
+            self.requests += 1
+            self.tokens = min(self.tokens + self.budget, self.max_tokens)
+
+        primary = _Attempt(replicas[0], self.engines[replicas[0]])
+        attempts = {self.executor.submit(self._search, primary, compiled): primary}
+        # time spent queued behind other callers' queries does not count towards the delay
+        primary.started.wait()
+        done, _ = futures.wait(attempts, timeout=self.hedge_delay())
+        first = next(iter(attempts))
+        if (not done or first.exception() is not None) and len(replicas) > 1 and self._take_token():
+            hedge = _Attempt(replicas[1], self.engines[replicas[1]])
+            attempts[self.executor.submit(self._search, hedge, compiled)] = hedge
+
+        pending = set(attempts)
+        error = None
+        while pending:
+            done, pending = futures.wait(pending, return_when=futures.FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    for other in pending:
+                        self._cancel(attempts[other])
+                    if attempts[future] is not primary:
+                        with self.lock:
+                            self.hedges_won += 1
+                    return future.result()
+                error = error or future.exception()
+        raise error
+
+    def dispose(self):
+        self.executor.shutdown(wait=False)
+        for engine in self.engines.values():
+            engine.dispose()
@@ -0,0 +1,92 @@
+""" Two phase loading: ids and weights from searchd, rows from the primary database"""
+
+from concurrent import futures
+
+from sqlalchemy import exc
+from sqlalchemy.orm import Session, class_mapper
+from sqlalchemy.orm.util import identity_key
+from sqlalchemy.pool import SingletonThreadPool, StaticPool
+
+__all__ = ("hydrate",)
+
+CHUNK_SIZE = 500
+
+
+def _chunks(values, size):
+    for position in range(0, len(values), size):
+        yield values[position:position + size]
+
+
+def _load_chunk(session, model, pk, ids):
+    return session.query(model).filter(pk.in_(ids)).all()
+
+
+def _load_chunk_in_session(engine, model, pk, ids):
+    # sessions are not thread safe, every chunk loads in its own and is merged afterwards
+    session = Session(bind=engine, expire_on_commit=False)
+    try:
+        instances = _load_chunk(session, model, pk, ids)
+        session.expunge_all()
+        return instances
+    finally:
+        session.close()
+
+
+def _parallel(engine, max_workers):
+    return max_workers > 1 and not isinstance(engine.pool, (SingletonThreadPool, StaticPool))
+
+
+def hydrate(search, model, session, chunk_size=CHUNK_SIZE, max_workers=1, cache=None):
+    """
+    Run a searchd query selecting (id, weight) or (id,) and load the matching primary rows.
+    search can be any iterable of such rows, e.g. a Query or a result.
+
+    Returns [(instance, weight), ...] in the order of the search results; weight is None when the
+    search selects ids only and ids missing from the primary database are skipped. Rows already
+    in the session's identity map or in cache (any mapping id -> instance) are not loaded again,
+    the others are loaded with IN queries of chunk_size ids, max_workers chunks at a time when
+    the primary engine's pool allows concurrent connections.
+
+    Example:
+    search = sphinx_session.query(Article.id, func.weight()).filter(Article.body.match("sphinx")).limit(100)
+    for article, weight in hydrate(search, Article, db_session):
+        ...
+    """
+    mapper = class_mapper(model)
+    if len(mapper.primary_key) != 1:
+        raise exc.ArgumentError("hydrate() needs a model with a single column primary key")
+    pk = getattr(model, mapper.get_property_by_column(mapper.primary_key[0]).key)
+
+    hits = [(row[0], row[1] if len(row) > 1 else None) for row in search]
+
+    loaded = {}
+    missing = []
+    seen = set()
+    for id_, _ in hits:
+        if id_ in seen:
+            continue
+        seen.add(id_)
+        instance = session.identity_map.get(identity_key(model, id_))
+        if instance is None and cache is not None:
+            instance = cache.get(id_)
+        if instance is not None:
+            loaded[id_] = instance
+        else:
+            missing.append(id_)
+
+    chunks = list(_chunks(missing, chunk_size))
+    engine = session.get_bind(mapper)
+    if len(chunks) > 1 and _parallel(engine, max_workers):
+        with futures.ThreadPoolExecutor(max_workers=min(max_workers, len(chunks))) as executor:
+            results = executor.map(lambda ids: _load_chunk_in_session(engine, model, pk, ids), chunks)
+            instances = [session.merge(instance, load=False) for chunk in results for instance in chunk]
+    else:
+        instances = [instance for ids in chunks for instance in _load_chunk(session, model, pk, ids)]
+
+    for instance in instances:
+        id_ = mapper.primary_key_from_instance(instance)[0]
+        loaded[id_] = instance
+        if cache is not None:
+            cache[id_] = instance
+
+    return [(loaded[id_], weight) for id_, weight in hits if id_ in loaded]
@@ -0,0 +1,178 @@
+""" Per-statement timings and sizes for queries executed through the Sphinx dialect"""
+
+import logging
+import threading
+import time
+
+from sqlalchemy_sphinx.utils import parse_meta, budget_exceeded
+
+__all__ = ("Instrumentation", "QueryStats", "LoggingSink", "HistogramSink")
+
+log = logging.getLogger("sqlalchemy_sphinx.instrumentation")
+
+
+class QueryStats(object):
+    __slots__ = ("statement", "parameters", "prepare_time", "execute_time", "fetch_time",
+                 "rows", "bytes", "server_time", "cached", "options", "budget_exceeded")
+
+    def __init__(self, statement, parameters):
+        self.statement = statement
+        self.parameters = parameters
+        # from before_execute to the cursor execute: compilation, parameter processing, connection checkout
+        self.prepare_time = 0.0
+        self.execute_time = 0.0
+        self.fetch_time = 0.0
+        self.rows = 0
+        self.bytes = 0
+        # searchd's own 'time' from SHOW META, when enabled
+        self.server_time = None
+        self.cached = False
+        # merged OPTION values of the statement and the budgets SHOW META shows it ran into
+        self.options = {}
+        self.budget_exceeded = ()
+
+    @property
+    def total_time(self):
+        return self.prepare_time + self.execute_time + self.fetch_time
+
+    def __repr__(self):
+        return ("<QueryStats prepare={0:.6f}s execute={1:.6f}s fetch={2:.6f}s rows={3} bytes={4} "
+                "server_time={5}>".format(self.prepare_time, self.execute_time, self.fetch_time,
+                                          self.rows, self.bytes, self.server_time))
+
+
+def _row_size(row):
+    size = 0
+    for value in row:
+        if value is None:
+            continue
+        if isinstance(value, (bytes, type(u""))):
+            size += len(value)
+        else:
+            size += 8
+    return size
+
+
+class MeasuredCursor(object):
+    """Proxy around a DBAPI cursor counting fetched rows, bytes and time, published on close"""
+
+    def __init__(self, cursor, connection, stats, instrumentation):
+        self._cursor = cursor
+        self._connection = connection
+        self._stats = stats
+        self._instrumentation = instrumentation
+        self._closed = False
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def _fetch(self, fetch, *args):
+        start = time.time()
+        result = fetch(*args)
+        self._stats.fetch_time += time.time() - start
+        return result
+
+    def fetchone(self):
+        row = self._fetch(self._cursor.fetchone)
+        if row is not None:
+            self._stats.rows += 1
+            self._stats.bytes += _row_size(row)
+        return row
+
+    def fetchmany(self, *args):
+        rows = self._fetch(self._cursor.fetchmany, *args)
+        self._stats.rows += len(rows)
+        self._stats.bytes += sum(_row_size(row) for row in rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._fetch(self._cursor.fetchall)
+        self._stats.rows += len(rows)
+        self._stats.bytes += sum(_row_size(row) for row in rows)
+        return rows
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._cursor.close()
+        self._instrumentation.finish(self._connection, self._stats)
+
+
+class LoggingSink(object):
+
+    def __init__(self, logger=log, level=logging.DEBUG):
+        self.logger = logger
+        self.level = level
+
+    def __call__(self, stats):
+        self.logger.log(self.level, "%r %s", stats, stats.statement)
+
+
+class HistogramSink(object):
+    """Counts statements per total duration bucket (upper bounds in seconds)"""
+
+    def __init__(self, buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0)):
+        self.buckets = tuple(buckets) + (float("inf"),)
+        self.counts = [0] * len(self.buckets)
+        # sinks are called from every thread finishing a statement
+        self.lock = threading.Lock()
+
+    def __call__(self, stats):
+        for position, bound in enumerate(self.buckets):
+            if stats.total_time <= bound:
+                with self.lock:
+                    self.counts[position] += 1
+                break
+
+
+class Instrumentation(object):
+    """
+    Records prepare, execute and fetch durations, row count and approximate bytes of every statement.
+
+    Passed to the engine with create_engine(..., instrumentation=Instrumentation(sinks=[...])).
+    Sinks are callables receiving a QueryStats once the result is closed. Statements slower than
+    slow_query_threshold seconds are logged with their full SphinxQL. With show_meta, searchd's
+    own query time is read with SHOW META after each SELECT, at the cost of an extra round trip,
+    and budget_exceeded names the OPTION budgets the query ran into.
+    """
+
+    def __init__(self, sinks=(), slow_query_threshold=None, show_meta=False, logger=log):
+        self.sinks = list(sinks)
+        self.slow_query_threshold = slow_query_threshold
+        self.show_meta = show_meta
+        self.logger = logger
+        # statements compile and execute on the calling thread
+        self._local = threading.local()
+
+    def before_execute(self, conn, clauseelement, multiparams, params):
+        self._local.started = time.time()
+
+    def execute(self, execute, cursor, statement, parameters, context):
+        """Run execute() and return the cursor the result has to be read from, wrapped for measuring"""
+        stats = QueryStats(statement, parameters)
+        stats.options = getattr(context.compiled, "sphinx_options", {})
+        start = time.time()
+        started = getattr(self._local, "started", None)
+        if started is not None:
+            stats.prepare_time = start - started
+            self._local.started = None
+        result_cursor = execute(cursor, statement, parameters, context)
+        stats.execute_time = time.time() - start
+        stats.cached = getattr(result_cursor, "hit", False)
+        return MeasuredCursor(result_cursor, context.root_connection.connection, stats, self)
+
+    def finish(self, connection, stats):
+        if self.show_meta and not stats.cached and stats.statement.lstrip()[:6].upper() == "SELECT":
+            meta_cursor = connection.cursor()
+            try:
+                meta_cursor.execute("SHOW META")
+                meta = parse_meta(meta_cursor.fetchall())
+                stats.server_time = meta.get("time")
+                stats.budget_exceeded = budget_exceeded(meta, stats.options)
+            finally:
+                meta_cursor.close()
+        if self.slow_query_threshold is not None and stats.total_time >= self.slow_query_threshold:
+            self.logger.warning("Slow SphinxQL (%.3fs): %s %r", stats.total_time, stats.statement, stats.parameters)
+        for sink in self.sinks:
+            sink(stats)
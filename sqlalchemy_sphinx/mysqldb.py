@@ -43,10 +43,6 @@ class Dialect(SphinxDialect, mysqldb_dialect.MySQLDialect_mysqldb):
     def get_isolation_level(self, connection):
         pass
 
-    def escape_value(self, value):
-        value = MySQLdb.escape_string(value.encode('utf8'))
-        return value.decode('utf8')
-
     @classmethod
     def dbapi(cls):
         return DBAPIShim()
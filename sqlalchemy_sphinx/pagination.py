@@ -0,0 +1,116 @@
+""" Pagination with the result count taken from SHOW META instead of a second COUNT query"""
+
+from sqlalchemy import func
+from sqlalchemy.sql import column
+
+from sqlalchemy_sphinx.batch import execute_raw, render_compiled
+from sqlalchemy_sphinx.utils import MAX_MATCHES, parse_meta, budget_exceeded
+
+__all__ = ("Page", "paginate", "keyset_page", "iter_keyset")
+
+
+class Page(object):
+
+    def __init__(self, items, page, per_page, meta, options=None):
+        self.items = items
+        self.page = page
+        self.per_page = per_page
+        self.meta = meta
+        # 'total' is capped by max_matches, 'total_found' is the real number of matches
+        self.total = meta.get("total", 0)
+        self.total_found = meta.get("total_found", 0)
+        self.time = meta.get("time")
+        # OPTION budgets the query ran into, e.g. ("max_query_time",) for partial results
+        self.budget_exceeded = budget_exceeded(meta, options or {})
+
+    @property
+    def pages(self):
+        if not self.per_page:
+            return 0
+        return (self.total + self.per_page - 1) // self.per_page
+
+    @property
+    def has_next(self):
+        return self.page < self.pages
+
+    @property
+    def has_prev(self):
+        return self.page > 1
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def paginate(bind, query, page=1, per_page=20):
+    """
+    Run one page of a query together with SHOW META, in a single round trip when the engine
+    was created with multi_statements=True.
+
+    Example:
+    page = paginate(engine, session.query(Model.id).filter(Model.name.match("adriel")), page=3)
+    page.items, page.total, page.total_found, page.time, page.budget_exceeded
+    """
+    if page < 1:
+        raise ValueError("page must be 1 or greater")
+    offset = (page - 1) * per_page
+    query = query.limit(per_page).offset(offset)
+    statement = getattr(query, "statement", query)
+    connection = bind.connect()
+    try:
+        dialect = connection.dialect
+        if dialect.derive_max_matches:
+            # a max_matches of offset + limit would cap 'total' at the current page
+            options = {"max_matches": max(dialect.default_options.get("max_matches", MAX_MATCHES), offset + per_page)}
+            options.update(statement._execution_options.get("sphinx_options", {}))
+            statement = statement.execution_options(sphinx_options=options)
+        compiled = statement.compile(dialect=dialect)
+        sql_text = render_compiled(dialect, connection.connection, compiled)
+        result_sets, meta_result_sets = execute_raw(connection, [sql_text, "SHOW META"])
+        rows, meta_rows = result_sets[0], meta_result_sets[0]
+    finally:
+        connection.close()
+    return Page(rows, page, per_page, parse_meta(meta_rows), compiled.sphinx_options)
+
+
+def _where(query, clause):
+    if hasattr(query, "filter"):
+        return query.filter(clause)
+    return query.where(clause)
+
+
+def keyset_page(query, id_column, last_id=None, batch_size=MAX_MATCHES):
+    """Build the query for the page of rows following last_id, ordered by id"""
+    if last_id is not None:
+        query = _where(query, id_column > last_id)
+    if batch_size > MAX_MATCHES:
+        query = _where(query, func.options(column("max_matches") == batch_size))
+    return query.order_by(None).order_by(id_column.asc()).limit(batch_size)
+
+
+def iter_keyset(query, id_column, batch_size=MAX_MATCHES, bind=None):
+    """
+    Lazily iterate every row of a query with WHERE id > :last ORDER BY id ASC LIMIT n pages.
+
+    Unlike OFFSET paging, searchd never has to keep more than batch_size matches per page,
+    so the iteration is not bounded by max_matches. id_column must be part of the selected columns.
+    ORM queries are executed through their session, select() objects through bind.
+
+    Example:
+    for row in iter_keyset(session.query(Model.id).filter(Model.name.match("adriel")), Model.id, 5000):
+        ...
+    """
+    last_id = None
+    while True:
+        page = keyset_page(query, id_column, last_id, batch_size)
+        if bind is not None:
+            rows = bind.execute(page).fetchall()
+        else:
+            rows = page.all()
+        for row in rows:
+            yield row
+        if len(rows) < batch_size:
+            return
+        last_id = getattr(rows[-1], id_column.key)
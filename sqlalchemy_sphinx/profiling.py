@@ -0,0 +1,200 @@
+""" searchd's SHOW PROFILE / SHOW PLAN captured next to the statements they describe"""
+
+import logging
+import random
+import re
+import sys
+from collections import OrderedDict
+
+from sqlalchemy import util
+
+__all__ = ("Profiler", "QueryProfile", "PlanNode", "ShapeSink", "parse_profile", "parse_plan")
+
+log = logging.getLogger("sqlalchemy_sphinx.profiling")
+
+PLAN_TOKEN_RE = re.compile(r"\s*([(),]|[^(),]+)")
+
+
+class PlanNode(object):
+    """One operator of a SHOW PLAN tree, e.g. KEYWORD(hello, querypos=1)"""
+
+    __slots__ = ("kind", "words", "attributes", "children")
+
+    def __init__(self, kind, words=None, attributes=None, children=None):
+        self.kind = kind
+        self.words = words or []
+        self.attributes = attributes or OrderedDict()
+        self.children = children or []
+
+    def walk(self):
+        yield self
+        for child in self.children:
+            for node in child.walk():
+                yield node
+
+    def shape(self):
+        """The tree without its keywords, e.g. AND(KEYWORD, KEYWORD), to group queries by"""
+        if not self.children:
+            return self.kind
+        return "{0}({1})".format(self.kind, ", ".join(child.shape() for child in self.children))
+
+    def __repr__(self):
+        items = self.words + ["{0}={1}".format(*item) for item in self.attributes.items()]
+        items.extend(repr(child) for child in self.children)
+        return "{0}({1})".format(self.kind, ", ".join(items))
+
+
+def _parse_node(tokens, position):
+    kind = tokens[position]
+    if tokens[position + 1] != "(":
+        raise ValueError("Expected '(' after {0}".format(kind))
+    node = PlanNode(kind)
+    position += 2
+    while tokens[position] != ")":
+        token = tokens[position]
+        if token == ",":
+            position += 1
+        elif tokens[position + 1] == "(":
+            child, position = _parse_node(tokens, position)
+            node.children.append(child)
+        elif "=" in token:
+            name, _, value = token.partition("=")
+            node.attributes[name.strip()] = value.strip()
+            position += 1
+        else:
+            node.words.append(token)
+            position += 1
+    return node, position + 1
+
+
+def parse_plan(text):
+    """Parse SHOW PLAN's transformed_tree into a PlanNode, None when it is empty"""
+    tokens = [token.strip() for token in PLAN_TOKEN_RE.findall(text or "") if token.strip()]
+    if not tokens:
+        return None
+    try:
+        node, position = _parse_node(tokens, 0)
+    except IndexError:
+        raise ValueError("Unbalanced plan: {0}".format(text))
+    if position != len(tokens):
+        raise ValueError("Unexpected text after plan: {0}".format(text))
+    return node
+
+
+def parse_profile(rows):
+    """Turn SHOW PROFILE rows (Status, Duration, Switches, Percent) into (stages, total seconds)"""
+    stages = OrderedDict()
+    total = 0.0
+    for row in rows:
+        status, duration = row[0], float(row[1])
+        if status == "total":
+            total = duration
+        else:
+            stages[status] = stages.get(status, 0.0) + duration
+    return stages, total
+
+
+class QueryProfile(object):
+    __slots__ = ("statement", "parameters", "stages", "total_time", "plan", "plan_text")
+
+    def __init__(self, statement, parameters, stages, total_time, plan, plan_text):
+        self.statement = statement
+        self.parameters = parameters
+        # stage name -> seconds spent in it by searchd, in execution order
+        self.stages = stages
+        self.total_time = total_time
+        # PlanNode tree, None when searchd showed no plan or it could not be parsed
+        self.plan = plan
+        self.plan_text = plan_text
+
+    @property
+    def shape(self):
+        return self.plan.shape() if self.plan is not None else None
+
+    def __repr__(self):
+        return "<QueryProfile total={0:.6f}s plan={1}>".format(self.total_time, self.plan_text)
+
+
+class ShapeSink(object):
+    """Count and searchd time of the profiled queries per plan shape"""
+
+    def __init__(self):
+        self.shapes = {}
+
+    def __call__(self, profile):
+        count, total = self.shapes.get(profile.shape, (0, 0.0))
+        self.shapes[profile.shape] = (count + 1, total + profile.total_time)
+
+    def slowest(self, count=10):
+        """[(shape, queries, seconds), ...] by total searchd time"""
+        items = sorted(self.shapes.items(), key=lambda item: -item[1][1])
+        return [(shape, queries, seconds) for shape, (queries, seconds) in items[:count]]
+
+
+class Profiler(object):
+    """
+    Turns on searchd's profiling and reads SHOW PROFILE and SHOW PLAN right after a SELECT.
+
+    Passed to the engine with create_engine(..., profiler=Profiler(sample_rate=0.01, sinks=[...])).
+    A SELECT is profiled when its execution options say sphinx_profile=True, and otherwise with
+    probability sample_rate unless they say sphinx_profile=False. The QueryProfile is handed to the
+    sinks and set on the result as result.profile. Profiling is switched on and off around each
+    profiled statement, four extra round trips; results served from the result cache and FACET
+    queries are not profiled.
+
+    Example:
+    result = session.execute(query.statement.execution_options(sphinx_profile=True))
+    result.profile.stages, result.profile.plan
+    """
+
+    def __init__(self, sample_rate=0.0, sinks=()):
+        self.sample_rate = sample_rate
+        self.sinks = list(sinks)
+        self.profiled = 0
+
+    def after_execute(self, conn, clauseelement, multiparams, params, result):
+        result.profile = getattr(result.context, "sphinx_profile", None)
+
+    def should_profile(self, statement, context):
+        if statement.lstrip()[:6].upper() != "SELECT" or getattr(context.compiled, "facets", None):
+            return False
+        enabled = context.execution_options.get("sphinx_profile")
+        if enabled is not None:
+            return enabled
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def execute(self, execute, cursor, statement, parameters, context):
+        # profiling is on only around this statement, the pooled connection goes back without it
+        profile_cursor = cursor.connection.cursor()
+        try:
+            profile_cursor.execute("SET profiling=1")
+            try:
+                execute(cursor, statement, parameters, context)
+                # the statement's rows are already buffered in its cursor
+                profile_cursor.execute("SHOW PROFILE")
+                stages, total_time = parse_profile(profile_cursor.fetchall())
+                profile_cursor.execute("SHOW PLAN")
+                plan_rows = profile_cursor.fetchall()
+            except Exception:
+                exc_info = sys.exc_info()
+                try:
+                    profile_cursor.execute("SET profiling=0")
+                except Exception:
+                    # the statement's error is the one to report
+                    pass
+                util.reraise(*exc_info)
+            profile_cursor.execute("SET profiling=0")
+        finally:
+            profile_cursor.close()
+        plan_text = u"".join(row[1] for row in plan_rows if row[0] == "transformed_tree")
+        try:
+            plan = parse_plan(plan_text)
+        except ValueError:
+            log.debug("Could not parse SHOW PLAN output %r", plan_text)
+            plan = None
+
+        profile = QueryProfile(statement, parameters, stages, total_time, plan, plan_text)
+        context.sphinx_profile = profile
+        self.profiled += 1
+        for sink in self.sinks:
+            sink(profile)
@@ -43,9 +43,6 @@ class Dialect(SphinxDialect, pymysql_dialect.MySQLDialect_pymysql):
     def get_isolation_level(self, connection):
         pass
 
-    def escape_value(self, value):
-        return pymysql.escape_string(value)
-
     @classmethod
     def dbapi(cls):
         return DBAPIShim()
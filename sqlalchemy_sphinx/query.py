@@ -0,0 +1,79 @@
+""" Query class returning searchd rows without building ORM instances"""
+
+from sqlalchemy import util
+from sqlalchemy.orm import Query
+
+__all__ = ("SphinxQuery", "hit_keys")
+
+
+def hit_keys(statement, entities=()):
+    """Names of a statement's result columns: mapped attribute names, labels, function names"""
+    labels = {}
+    mappers = []
+    for entity in entities:
+        column = getattr(entity, "column", None)
+        if column is not None:
+            labels[column] = entity._label_name
+        mapper = getattr(entity, "mapper", None)
+        if mapper is not None:
+            mappers.append(mapper)
+
+    keys = []
+    for position, column in enumerate(util.unique_list(statement.inner_columns)):
+        key = labels.get(column)
+        if key is None:
+            for mapper in mappers:
+                if column in mapper._columntoproperty:
+                    key = mapper._columntoproperty[column].key
+                    break
+        if key is None:
+            # unlabeled expressions, e.g. func.weight() -> 'weight'
+            key = getattr(getattr(column, "element", column), "name", None) or "column_{0}".format(position)
+        keys.append(key)
+    return keys
+
+
+class SphinxQuery(Query):
+    """
+    Query class for sessions bound to searchd, used with sessionmaker(query_cls=SphinxQuery).
+
+    Search hits are immutable, so tuples() and hits() read the DBAPI rows as they are: no identity
+    map, no instance state or deferred column bookkeeping, no result type processing. hits() names
+    the values after the mapped attributes, query.execution_options(sphinx_hits=True) makes
+    iterating, all() and first() return hits as well.
+
+    Example:
+    Session = sessionmaker(bind=sphinx_engine, query_cls=SphinxQuery)
+    for hit in Session().query(Model, func.weight()).filter(Model.name.match("adriel")).hits():
+        hit.id, hit.name, hit.weight
+    """
+
+    def _raw_rows(self, statement):
+        if self._autoflush and not self._populate_existing:
+            self.session._autoflush()
+        connection = self._connection_from_session(
+            mapper=self._bind_mapper(), clause=statement, close_with_result=True)
+        if self._execution_options:
+            connection = connection.execution_options(**self._execution_options)
+        result = connection.execute(statement)
+        try:
+            if result.cursor is None or result.cursor.description is None:
+                return []
+            return result.cursor.fetchall()
+        finally:
+            result.close()
+
+    def tuples(self):
+        """The rows as plain tuples"""
+        return self._raw_rows(self.statement)
+
+    def hits(self):
+        """The rows as light named tuples, e.g. hit.id, hit.weight"""
+        statement = self.statement
+        hit = util.lightweight_named_tuple("hit", hit_keys(statement, self._entities))
+        return [hit(row) for row in self._raw_rows(statement)]
+
+    def __iter__(self):
+        if self._execution_options.get("sphinx_hits"):
+            return iter(self.hits())
+        return super(SphinxQuery, self).__iter__()
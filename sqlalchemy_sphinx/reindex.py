@@ -0,0 +1,208 @@
+""" Full rebuild of an RT index from a primary database, swapped in once complete"""
+
+import json
+import os
+import threading
+import time
+from concurrent import futures
+
+from sqlalchemy import MetaData, Table, and_, func, select
+
+from sqlalchemy_sphinx.batch import execute_raw
+from sqlalchemy_sphinx.rt import CHUNK_SIZE, MAX_PACKET_SIZE, _id_key, bulk_replace
+
+__all__ = ("ReindexPipeline", "ReindexProgress", "FileCheckpoint", "partition_ids")
+
+
+def partition_ids(low, high, partitions):
+    """Split the ids low..high into at most partitions [start, end) ranges of equal width"""
+    if low is None or high is None:
+        return []
+    step = max(-(-(high - low + 1) // partitions), 1)
+    return [[start, min(start + step, high + 1)] for start in range(low, high + 1, step)]
+
+
+class FileCheckpoint(object):
+    """Keeps the pipeline state in a JSON file, replaced atomically on every save"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path) as checkpoint_file:
+            return json.load(checkpoint_file)
+
+    def save(self, state):
+        temporary = self.path + ".tmp"
+        with open(temporary, "w") as checkpoint_file:
+            json.dump(state, checkpoint_file)
+        if os.path.exists(self.path) and os.name == "nt":
+            os.remove(self.path)
+        os.rename(temporary, self.path)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class ReindexProgress(object):
+    __slots__ = ("rows", "partitions", "partitions_done", "started")
+
+    def __init__(self, partitions, partitions_done=0):
+        self.rows = 0
+        self.partitions = partitions
+        self.partitions_done = partitions_done
+        self.started = time.time()
+
+    @property
+    def elapsed(self):
+        return time.time() - self.started
+
+    @property
+    def rows_per_second(self):
+        elapsed = self.elapsed
+        return self.rows / elapsed if elapsed > 0 else 0.0
+
+    def __repr__(self):
+        return "<ReindexProgress rows={0} partitions={1}/{2} {3:.0f} rows/s>".format(
+            self.rows, self.partitions_done, self.partitions, self.rows_per_second)
+
+
+class ReindexPipeline(object):
+    """
+    Rebuild the RT index target from a query on the primary database.
+
+    The source query's id range is split into partitions, read in id order by max_workers
+    threads with server side cursors (stream_results) and REPLACEd into the RT index staging
+    in chunks of chunk_size rows. staging must have the schema of target; it is emptied with
+    TRUNCATE RTINDEX when a run starts and swapped in at the end with
+    ATTACH INDEX staging TO RTINDEX target WITH TRUNCATE.
+
+    The source query selects the columns of target by name; id_column is the source column
+    holding the document id. progress is called with a ReindexProgress after every chunk. With a
+    checkpoint, e.g. FileCheckpoint(path), the last id written of every partition is saved after
+    each chunk and a failed run continues from there when run again. The result cache entries
+    of target are dropped after the swap.
+
+    Example:
+    pipeline = ReindexPipeline(db_engine, session.query(Article.id, Article.title, Article.body), Article.id,
+                               sphinx_engine, RTArticle, "articles_staging", partitions=32, max_workers=8,
+                               checkpoint=FileCheckpoint("/var/tmp/articles.reindex"), progress=print)
+    pipeline.run()
+    """
+
+    def __init__(self, source_bind, source, id_column, sphinx_bind, target, staging, partitions=16, max_workers=4,
+                 chunk_size=CHUNK_SIZE, max_packet_size=MAX_PACKET_SIZE, checkpoint=None, progress=None):
+        self.source_bind = source_bind
+        self.source = getattr(source, "statement", source)
+        self.id_column = id_column.__clause_element__() if hasattr(id_column, "__clause_element__") else id_column
+        self.sphinx_bind = sphinx_bind
+        self.target = getattr(target, "__table__", target)
+        self.staging = Table(staging, MetaData(), *[column.copy() for column in self.target.columns])
+        self.partitions = partitions
+        self.max_workers = max_workers
+        self.chunk_size = chunk_size
+        self.max_packet_size = max_packet_size
+        self.checkpoint = checkpoint
+        self.progress_callback = progress
+        self.progress = None
+        self._state = None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def _execute(self, sql_text):
+        execute_raw(self.sphinx_bind, sql_text)
+
+    def _quote(self, name):
+        return self.sphinx_bind.dialect.identifier_preparer.quote(name)
+
+    def _start(self):
+        """Resume from the checkpoint or partition the source's id range and empty staging"""
+        state = self.checkpoint.load() if self.checkpoint is not None else None
+        if state is not None:
+            return state
+        ids = self.source.alias().corresponding_column(self.id_column)
+        low, high = self.source_bind.execute(select([func.min(ids), func.max(ids)])).first()
+        state = {"ranges": partition_ids(low, high, self.partitions), "positions": {}, "done": []}
+        self._execute("TRUNCATE RTINDEX {0}".format(self._quote(self.staging.name)))
+        self._save(state)
+        return state
+
+    def _save(self, state):
+        if self.checkpoint is not None:
+            self.checkpoint.save(state)
+
+    def _chunk_done(self, partition, rows):
+        with self._lock:
+            self._state["positions"][str(partition)] = rows[-1][_id_key(self.target)]
+            self.progress.rows += len(rows)
+            self._save(self._state)
+            progress = self.progress
+        if self.progress_callback is not None:
+            self.progress_callback(progress)
+
+    def _partition_done(self, partition):
+        with self._lock:
+            self._state["done"].append(partition)
+            self.progress.partitions_done += 1
+            self._save(self._state)
+
+    def _load_partition(self, partition):
+        start, end = self._state["ranges"][partition]
+        position = self._state["positions"].get(str(partition))
+        condition = self.id_column > position if position is not None else self.id_column >= start
+        statement = self.source.where(and_(condition, self.id_column < end)).order_by(self.id_column)
+        keys = [column.key for column in self.target.columns]
+
+        source_connection = self.source_bind.connect()
+        sphinx_connection = self.sphinx_bind.connect()
+        try:
+            result = source_connection.execution_options(stream_results=True).execute(statement)
+            try:
+                while True:
+                    if self._stopped.is_set():
+                        return
+                    rows = [dict((key, row[key]) for key in keys) for row in result.fetchmany(self.chunk_size)]
+                    if not rows:
+                        break
+                    bulk_replace(sphinx_connection, self.staging, rows, chunk_size=self.chunk_size,
+                                 max_packet_size=self.max_packet_size)
+                    self._chunk_done(partition, rows)
+            finally:
+                result.close()
+        finally:
+            sphinx_connection.close()
+            source_connection.close()
+        self._partition_done(partition)
+
+    def run(self):
+        """Load every partition into staging and swap it in, returns the ReindexProgress"""
+        self._stopped.clear()
+        self._state = self._start()
+        pending = [partition for partition in range(len(self._state["ranges"]))
+                   if partition not in self._state["done"]]
+        self.progress = ReindexProgress(len(self._state["ranges"]), len(self._state["done"]))
+
+        with futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            loads = [executor.submit(self._load_partition, partition) for partition in pending]
+            done, not_done = futures.wait(loads, return_when=futures.FIRST_EXCEPTION)
+            errors = [load.exception() for load in done if load.exception() is not None]
+            if errors:
+                # partitions already loading stop after their current chunk
+                self._stopped.set()
+                for load in not_done:
+                    load.cancel()
+        if errors:
+            raise errors[0]
+
+        self._execute("ATTACH INDEX {0} TO RTINDEX {1} WITH TRUNCATE".format(
+            self._quote(self.staging.name), self._quote(self.target.name)))
+        result_cache = self.sphinx_bind.dialect.result_cache
+        if result_cache is not None:
+            # cached searches of target were answered from the documents it had before the swap
+            result_cache.invalidate(self.target.name)
+        if self.checkpoint is not None:
+            self.checkpoint.clear()
+        return self.progress
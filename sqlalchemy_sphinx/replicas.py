@@ -0,0 +1,113 @@
+""" Latency-aware routing between identical searchd replicas"""
+
+import threading
+import time
+
+__all__ = ("ReplicaRouter", "parse_hosts")
+
+DEFAULT_PORT = 9306
+
+
+def parse_hosts(url):
+    """
+    Read the replica list of a URL, either 'sphinx://h1,h2,h3:9306' or
+    'sphinx:///?hosts=h1:9306,h2:9307' when the ports differ.
+    """
+    hosts = url.query.get("hosts")
+    if hosts:
+        hosts = hosts.split(",")
+    elif url.host and "," in url.host:
+        hosts = url.host.split(",")
+    else:
+        return []
+    replicas = []
+    for host in hosts:
+        host, _, port = host.strip().partition(":")
+        replicas.append((host, int(port or url.port or DEFAULT_PORT)))
+    return replicas
+
+
+class ReplicaRouter(object):
+    """
+    Keeps exponentially weighted moving averages of the execute and the connect latency of
+    every replica. Routing compares execute latencies only, the connect latency breaks ties
+    between replicas no query has been timed on yet. Replicas that fail are ejected and only
+    tried again once the cooldown has passed.
+    """
+
+    def __init__(self, replicas, alpha=0.3, cooldown=30.0, tolerance=2.0, max_age=60.0):
+        self.replicas = list(replicas)
+        self.alpha = alpha
+        self.cooldown = cooldown
+        # a pooled connection is moved once its replica is this many times slower than the best one
+        self.tolerance = tolerance
+        # latencies not refreshed for max_age seconds are measured again
+        self.max_age = max_age
+        self.latency = dict((replica, None) for replica in self.replicas)
+        self.connect_latency = dict((replica, None) for replica in self.replicas)
+        self.updated = {}
+        self.connect_updated = {}
+        self.ejected = {}
+        self.lock = threading.Lock()
+
+    def _latency(self, replica, now):
+        if now - self.updated.get(replica, 0) > self.max_age:
+            return None
+        return self.latency[replica]
+
+    def _connect_latency(self, replica, now):
+        if now - self.connect_updated.get(replica, 0) > self.max_age:
+            return None
+        return self.connect_latency[replica]
+
+    def _average(self, previous, seconds):
+        if previous is None:
+            return seconds
+        return self.alpha * seconds + (1 - self.alpha) * previous
+
+    def _available(self, now):
+        return [replica for replica in self.replicas if self.ejected.get(replica, 0) <= now]
+
+    def candidates(self):
+        """Replicas in the order they should be tried, unknown latencies first so they get measured"""
+        with self.lock:
+            now = time.time()
+            available = self._available(now)
+            if not available:
+                # everything is ejected, try the replica coming back first
+                return sorted(self.replicas, key=lambda replica: self.ejected[replica])
+            return sorted(available, key=lambda replica: (self._latency(replica, now) or 0.0,
+                                                          self._connect_latency(replica, now) or 0.0))
+
+    def observe(self, replica, seconds):
+        """Record how long a query took on the replica"""
+        with self.lock:
+            now = time.time()
+            self.ejected.pop(replica, None)
+            self.latency[replica] = self._average(self._latency(replica, now), seconds)
+            self.updated[replica] = now
+
+    def observe_connect(self, replica, seconds):
+        """Record how long opening a connection to the replica took"""
+        with self.lock:
+            now = time.time()
+            self.ejected.pop(replica, None)
+            self.connect_latency[replica] = self._average(self._connect_latency(replica, now), seconds)
+            self.connect_updated[replica] = now
+
+    def eject(self, replica):
+        with self.lock:
+            self.ejected[replica] = time.time() + self.cooldown
+
+    def should_move(self, replica):
+        """True when a connection to this replica should be replaced by one to a better replica"""
+        with self.lock:
+            now = time.time()
+            if self.ejected.get(replica, 0) > now:
+                return True
+            latencies = [self._latency(other, now) for other in self._available(now)]
+            latencies = [latency for latency in latencies if latency is not None]
+            current = self._latency(replica, now)
+            if not latencies or current is None:
+                return False
+            return current > min(latencies) * self.tolerance
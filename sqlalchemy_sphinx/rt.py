@@ -0,0 +1,101 @@
+""" Bulk writes into real-time indexes"""
+
+from sqlalchemy import exc
+from sqlalchemy import util
+
+__all__ = ("bulk_insert", "bulk_replace", "iter_bulk_statements")
+
+# searchd's default max_packet_size is 8M
+MAX_PACKET_SIZE = 8 * 1024 * 1024
+CHUNK_SIZE = 1000
+
+
+def _id_key(table):
+    primary_key = list(table.primary_key.columns)
+    return primary_key[0].key if primary_key else "id"
+
+
+def _row_value(row, key):
+    if isinstance(row, dict):
+        return row[key]
+    return getattr(row, key)
+
+
+def iter_bulk_statements(dialect, dbapi_connection, target, rows, columns=None, replace=True,
+                         chunk_size=CHUNK_SIZE, max_packet_size=MAX_PACKET_SIZE):
+    """
+    Render an iterable of dicts or model instances into multi-row INSERT/REPLACE statements.
+
+    Statements are yielded as soon as they hold chunk_size rows or would grow past max_packet_size,
+    so rows may come from a generator without being held in memory.
+    Yields (sql_text, row_count) tuples.
+    """
+    table = getattr(target, "__table__", target)
+    if columns is None:
+        columns = [column.key for column in table.columns]
+    preparer = dialect.identifier_preparer
+    header = u"{0} INTO {1} ({2}) VALUES ".format(
+        "REPLACE" if replace else "INSERT",
+        preparer.format_table(table),
+        ", ".join(preparer.quote(table.columns[key].name) for key in columns)
+    )
+    header_size = len(header.encode("utf8"))
+
+    values = []
+    size = header_size
+    for row in rows:
+        value = u"({0})".format(", ".join(
+            dialect.literal_value(dbapi_connection, _row_value(row, key)) for key in columns
+        ))
+        # +2 for the ", " separator
+        value_size = len(value.encode("utf8")) + 2
+        if values and (len(values) >= chunk_size or size + value_size > max_packet_size):
+            yield header + u", ".join(values), len(values)
+            values = []
+            size = header_size
+        values.append(value)
+        size += value_size
+    if values:
+        yield header + u", ".join(values), len(values)
+
+
+def _bulk_write(bind, target, rows, replace, **kwargs):
+    connection = bind.connect()
+    try:
+        dbapi_connection = connection.connection
+        count = 0
+        dialect = connection.dialect
+        cursor = dbapi_connection.cursor()
+        try:
+            for sql_text, row_count in iter_bulk_statements(
+                    dialect, dbapi_connection, target, rows, replace=replace, **kwargs):
+                try:
+                    cursor.execute(sql_text)
+                except dialect.dbapi.Error as e:
+                    util.raise_(
+                        exc.DBAPIError.instance(sql_text, None, e, dialect.dbapi.Error),
+                        from_=e
+                    )
+                count += row_count
+        finally:
+            cursor.close()
+            if dialect.result_cache is not None:
+                dialect.result_cache.invalidate(getattr(target, "__table__", target).name)
+        return count
+    finally:
+        connection.close()
+
+
+def bulk_replace(bind, target, rows, **kwargs):
+    """
+    REPLACE rows into an RT index in multi-row chunks, returns the number of rows sent.
+
+    Example:
+    bulk_replace(engine, RTModel, ({"id": doc.id, "title": doc.title} for doc in documents), chunk_size=500)
+    """
+    return _bulk_write(bind, target, rows, True, **kwargs)
+
+
+def bulk_insert(bind, target, rows, **kwargs):
+    """INSERT rows into an RT index in multi-row chunks, returns the number of rows sent."""
+    return _bulk_write(bind, target, rows, False, **kwargs)
@@ -0,0 +1,188 @@
+""" Client side scatter-gather of one query across several searchd shards"""
+
+import math
+from concurrent import futures
+
+from sqlalchemy import create_engine, exc
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.sql import operators
+from sqlalchemy.sql.elements import (
+    ColumnClause, Label, UnaryExpression, _label_reference, _textual_label_reference
+)
+
+from sqlalchemy_sphinx.batch import execute_raw, render_statement
+from sqlalchemy_sphinx.utils import parse_meta
+
+__all__ = ("ShardedSearch", "ShardedResult", "merge_meta", "merge_rows", "order_keys", "timeout_connect_args")
+
+
+def order_keys(statement):
+    """
+    Map the ORDER BY of a statement to (result column name, descending) pairs.
+
+    Expressions such as WEIGHT() have to be selected with a label to be merged:
+    select([Model.id, func.weight().label("weight")]).order_by(desc("weight"))
+    """
+    statement = getattr(statement, "statement", statement)
+    keys = []
+    for clause in statement._order_by_clause.clauses:
+        if isinstance(clause, _label_reference):
+            clause = clause.element
+        descending = False
+        if isinstance(clause, UnaryExpression) and clause.modifier in (operators.desc_op, operators.asc_op):
+            descending = clause.modifier is operators.desc_op
+            clause = clause.element
+        if isinstance(clause, _textual_label_reference):
+            keys.append((clause.element, descending))
+        elif isinstance(clause, Label):
+            keys.append((clause.name, descending))
+        elif isinstance(clause, ColumnClause):
+            keys.append((clause.name, descending))
+        else:
+            # expressions are matched by their SQL text against the labeled select columns
+            for column in statement.inner_columns:
+                if isinstance(column, Label) and str(column.element) == str(clause):
+                    keys.append((column.name, descending))
+                    break
+            else:
+                raise exc.ArgumentError(
+                    "ORDER BY expressions have to be selected columns or labels to merge shard results"
+                )
+    return keys
+
+
+def merge_rows(result_sets, keys, offset=0, limit=None):
+    """Merge per-shard result sets into one list ordered by keys, then apply offset/limit"""
+    rows = [row for result_set in result_sets for row in result_set]
+    # stable sorts from the least to the most significant key allow mixed directions
+    for name, descending in reversed(keys):
+        rows.sort(key=lambda row: getattr(row, name), reverse=descending)
+    if limit is None:
+        return rows[offset:]
+    return rows[offset:offset + limit]
+
+
+def merge_meta(metas):
+    """Sum the match counters of several SHOW META results, searches ran in parallel so time is the max"""
+    merged = {"total": 0, "total_found": 0, "time": 0.0}
+    for meta in metas:
+        merged["total"] += meta.get("total", 0)
+        merged["total_found"] += meta.get("total_found", 0)
+        merged["time"] = max(merged["time"], meta.get("time", 0.0))
+    return merged
+
+
+def timeout_connect_args(url, timeout):
+    """Driver arguments that make a shard's socket give up after timeout seconds"""
+    driver = make_url(url).get_dialect().driver
+    if driver == "mysqldb":
+        # libmysqlclient only takes whole seconds
+        timeout = max(int(math.ceil(timeout)), 1)
+        return {"connect_timeout": timeout, "read_timeout": timeout, "write_timeout": timeout}
+    if driver == "pymysql":
+        return {"connect_timeout": timeout, "read_timeout": timeout, "write_timeout": timeout}
+    # cymysql keeps its connect timeout on the socket for every later read and write
+    return {"connect_timeout": timeout}
+
+
+class ShardedResult(object):
+
+    def __init__(self, rows, meta, errors):
+        self.rows = rows
+        self.meta = meta
+        # shard url -> exception, for shards that failed or did not answer in time
+        self.errors = errors
+
+    @property
+    def partial(self):
+        return bool(self.errors)
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+
+class ShardedSearch(object):
+    """
+    Run one query in parallel against several searchd shards and merge the results
+    into a single top-K list by the query's ORDER BY.
+
+    timeout is also set as the read and write timeout of the shard connections, so the search
+    of a hung shard fails and its connection is discarded instead of holding a worker. Every
+    shard has its own max_workers threads, a slow shard never delays the searches of another.
+
+    Example:
+    shards = ShardedSearch(["sphinx://h1:9306", "sphinx://h2:9306"], timeout=0.5)
+    result = shards.execute(query.order_by(desc("weight")).limit(20))
+    result.rows, result.meta["total_found"], result.partial
+    """
+
+    def __init__(self, urls, timeout=None, allow_partial=True, max_workers=4, **engine_kwargs):
+        self.urls = list(urls)
+        self.engines = [create_engine(url, **self._engine_kwargs(url, timeout, engine_kwargs)) for url in self.urls]
+        self.timeout = timeout
+        self.allow_partial = allow_partial
+        self.executors = [futures.ThreadPoolExecutor(max_workers=max_workers) for _ in self.engines]
+
+    @staticmethod
+    def _engine_kwargs(url, timeout, engine_kwargs):
+        if timeout is None:
+            return engine_kwargs
+        connect_args = timeout_connect_args(url, timeout)
+        connect_args.update(engine_kwargs.get("connect_args", {}))
+        return dict(engine_kwargs, connect_args=connect_args)
+
+    def _search(self, engine, statement):
+        connection = engine.connect()
+        try:
+            sql_text = render_statement(connection.dialect, connection.connection, statement)
+            result_sets, meta_result_sets = execute_raw(connection, [sql_text, "SHOW META"])
+            rows, meta_rows = result_sets[0], meta_result_sets[0]
+        except exc.DBAPIError:
+            # a timed out or failed batch can leave unread results behind on the connection
+            connection.invalidate()
+            raise
+        finally:
+            connection.close()
+        return rows, parse_meta(meta_rows)
+
+    def execute(self, query, timeout=None):
+        statement = getattr(query, "statement", query)
+        keys = order_keys(statement)
+        offset = statement._offset or 0
+        limit = statement._limit
+        if limit is not None:
+            # every shard has to return its own top offset+limit for the merge to be exact
+            statement = statement.limit(offset + limit).offset(None)
+
+        pending = dict(
+            (executor.submit(self._search, engine, statement), url)
+            for executor, engine, url in zip(self.executors, self.engines, self.urls)
+        )
+        done, not_done = futures.wait(pending, timeout=timeout if timeout is not None else self.timeout)
+
+        result_sets, metas, errors = [], [], {}
+        for future in not_done:
+            # searches still queued behind a hung one are dropped, running ones end at the socket timeout
+            future.cancel()
+            errors[pending[future]] = futures.TimeoutError("shard did not answer in time")
+        for future in done:
+            error = future.exception()
+            if error is not None:
+                errors[pending[future]] = error
+                continue
+            rows, meta = future.result()
+            result_sets.append(rows)
+            metas.append(meta)
+
+        if errors and (not self.allow_partial or not result_sets):
+            raise list(errors.values())[0]
+        return ShardedResult(merge_rows(result_sets, keys, offset, limit), merge_meta(metas), errors)
+
+    def dispose(self):
+        for executor in self.executors:
+            executor.shutdown(wait=False)
+        for engine in self.engines:
+            engine.dispose()
@@ -0,0 +1,55 @@
+""" Highlighting many documents with as few CALL SNIPPETS round trips as possible"""
+
+from concurrent import futures
+
+from sqlalchemy.engine import Engine
+
+from sqlalchemy_sphinx.dialect import snippets
+from sqlalchemy_sphinx.rt import MAX_PACKET_SIZE
+
+__all__ = ("call_snippets", "snippets")
+
+CHUNK_SIZE = 100
+
+
+def _chunks(documents, chunk_size, max_packet_size):
+    chunk, size = [], 0
+    for document in documents:
+        # escaping can at most double a document, plus quotes and separator
+        document_size = 2 * len(document.encode("utf8") if not isinstance(document, bytes) else document) + 4
+        if chunk and (len(chunk) >= chunk_size or size + document_size > max_packet_size):
+            yield chunk
+            chunk, size = [], 0
+        chunk.append(document)
+        size += document_size
+    if chunk:
+        yield chunk
+
+
+def call_snippets(bind, documents, index, query, chunk_size=CHUNK_SIZE, max_packet_size=MAX_PACKET_SIZE,
+                  max_workers=4, exact=False, **options):
+    """
+    Build snippets for documents, returned as a list aligned with them.
+
+    Documents go to searchd in CALL SNIPPETS statements of at most chunk_size documents and
+    max_packet_size bytes. With an Engine, several of those run concurrently on their own
+    connections. Keyword options are CALL SNIPPETS options, e.g. limit=80, before_match="<b>".
+
+    Example:
+    call_snippets(engine, [article.body for article in page], "articles", "sphinx search", limit=200)
+    """
+    documents = list(documents)
+    if not documents:
+        return []
+    chunks = list(_chunks(documents, chunk_size, max_packet_size))
+
+    def highlight(chunk):
+        rows = bind.execute(snippets(chunk, index, query, exact=exact, **options)).fetchall()
+        return [row[0] for row in rows]
+
+    if len(chunks) == 1 or max_workers <= 1 or not isinstance(bind, Engine):
+        results = [highlight(chunk) for chunk in chunks]
+    else:
+        with futures.ThreadPoolExecutor(max_workers=min(max_workers, len(chunks))) as executor:
+            results = list(executor.map(highlight, chunks))
+    return [snippet for result in results for snippet in result]
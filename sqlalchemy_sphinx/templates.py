@@ -0,0 +1,69 @@
+""" Query shapes compiled once, executed with new search text and values"""
+
+from collections import OrderedDict
+
+from sqlalchemy import exc, util
+from sqlalchemy.orm import Query
+from sqlalchemy.types import String
+
+from sqlalchemy_sphinx.query import hit_keys
+
+__all__ = ("QueryTemplate",)
+
+
+class QueryTemplate(object):
+    """
+    A query compiled once to SphinxQL with a slot for every bindparam() it names.
+
+    execute() only composes the escaped MATCH text, processes the bound values and sends the
+    frozen statement, SphinxCompiler does not run again. Slot values are passed by bindparam
+    name; the MATCH text is always bound, also when the engine inlines it. LIMIT and OFFSET
+    can be slots too. Rows are light named tuples keyed like SphinxQuery.hits(): the mapped
+    attribute names of the query's entities.
+
+    Example:
+    search = QueryTemplate(engine, session.query(Article.id, Article.title).filter(
+        Article.body.match(bindparam("text")), Article.category_id == bindparam("category")
+    ).limit(bindparam("limit", type_=Integer)))
+    for hit in search.execute(text="sphinx", category=3, limit=20):
+        hit.id, hit.title
+    """
+
+    def __init__(self, bind, query):
+        self.bind = bind
+        statement = getattr(query, "statement", query)
+        dialect = bind.dialect
+        self.compiled = dialect.statement_compiler(dialect, statement, bind_match_params=True)
+        entities = query._entities if isinstance(query, Query) else ()
+        self.hit = util.lightweight_named_tuple("hit", hit_keys(statement, entities))
+
+        # slot name -> type, for the bindparam()s named by the query
+        self.slots = OrderedDict()
+        for bind_param in self.compiled.binds.values():
+            if not bind_param.unique:
+                self.slots[bind_param.key] = bind_param.type
+        for terms in self.compiled.match_binds.values():
+            for _, right in terms:
+                if not right.unique:
+                    self.slots[right.key] = String()
+
+    @property
+    def sql(self):
+        return self.compiled.string
+
+    def execute(self, **params):
+        unknown = set(params).difference(self.slots)
+        if unknown:
+            raise exc.ArgumentError("Unknown template slots: {0}".format(", ".join(sorted(unknown))))
+        missing = set(self.slots).difference(params)
+        if missing:
+            raise exc.ArgumentError("Missing template slots: {0}".format(", ".join(sorted(missing))))
+
+        result = self.bind.execute(self.compiled, params)
+        try:
+            if result.cursor is None or result.cursor.description is None:
+                return []
+            rows = result.cursor.fetchall()
+        finally:
+            result.close()
+        return [self.hit(row) for row in rows]
@@ -0,0 +1,396 @@
+"""
+In-process stand-in for searchd speaking enough of the MySQL wire protocol to answer SphinxQL.
+
+It is meant for tests and load benchmarks of the client side (pooling, batching, result decoding),
+not for checking search semantics: results are canned or generated from the select list.
+
+Example:
+server = FakeSearchd(rows=20, latency=0.002).start()
+engine = create_engine("sphinx+pymysql://127.0.0.1:{0}".format(server.port))
+...
+server.stop()
+"""
+
+import re
+import struct
+import threading
+import time
+
+try:
+    import socketserver
+except ImportError:  # python 2
+    import SocketServer as socketserver
+
+__all__ = ("FakeSearchd", "generate_result", "split_statements")
+
+# capability flags
+CLIENT_LONG_PASSWORD = 1
+CLIENT_CONNECT_WITH_DB = 8
+CLIENT_PROTOCOL_41 = 512
+CLIENT_TRANSACTIONS = 8192
+CLIENT_SECURE_CONNECTION = 32768
+CLIENT_MULTI_STATEMENTS = 1 << 16
+CLIENT_MULTI_RESULTS = 1 << 17
+CLIENT_PLUGIN_AUTH = 1 << 19
+CAPABILITIES = (CLIENT_LONG_PASSWORD | CLIENT_CONNECT_WITH_DB | CLIENT_PROTOCOL_41 | CLIENT_TRANSACTIONS |
+                CLIENT_SECURE_CONNECTION | CLIENT_MULTI_STATEMENTS | CLIENT_MULTI_RESULTS | CLIENT_PLUGIN_AUTH)
+
+SERVER_STATUS_AUTOCOMMIT = 2
+SERVER_MORE_RESULTS_EXISTS = 8
+
+COM_QUIT = 1
+COM_INIT_DB = 2
+COM_QUERY = 3
+COM_PING = 14
+
+TYPE_DOUBLE = 5
+TYPE_LONGLONG = 8
+TYPE_VAR_STRING = 253
+
+UTF8_GENERAL_CI = 33
+BINARY_CHARSET = 63
+
+SELECT_RE = re.compile(r"^\s*SELECT\s+(.*?)\s+FROM\s", re.I | re.S)
+FACET_RE = re.compile(r"\sFACET\s", re.I)
+LIMIT_RE = re.compile(r"\sLIMIT\s+(\d+)\s*(?:,\s*(\d+))?", re.I)
+
+
+def _lenenc_int(value):
+    if value < 251:
+        return struct.pack("<B", value)
+    if value < 1 << 16:
+        return b"\xfc" + struct.pack("<H", value)
+    if value < 1 << 24:
+        return b"\xfd" + struct.pack("<I", value)[:3]
+    return b"\xfe" + struct.pack("<Q", value)
+
+
+def _lenenc_str(value):
+    if not isinstance(value, bytes):
+        value = u"{0}".format(value).encode("utf8")
+    return _lenenc_int(len(value)) + value
+
+
+def split_statements(sql_text):
+    """Split a multi-statement query on ';' outside of string literals"""
+    statements = []
+    current = []
+    quote = None
+    escaped = False
+    for char in sql_text:
+        if escaped:
+            escaped = False
+        elif char == "\\":
+            escaped = True
+        elif quote:
+            if char == quote:
+                quote = None
+        elif char in "'\"":
+            quote = char
+        elif char == ";":
+            statements.append("".join(current))
+            current = []
+            continue
+        current.append(char)
+    statements.append("".join(current))
+    return [statement.strip() for statement in statements if statement.strip()]
+
+
+def _string_literals(text):
+    """Unescaped string literals at the start of text, up to the first ')' outside of them"""
+    literals = []
+    current = None
+    escaped = False
+    for char in text:
+        if current is None:
+            if char == ")":
+                break
+            if char == "'":
+                current = []
+        elif escaped:
+            current.append({"n": "\n", "r": "\r", "0": "\0", "Z": "\x1a"}.get(char, char))
+            escaped = False
+        elif char == "\\":
+            escaped = True
+        elif char == "'":
+            literals.append(u"".join(current))
+            current = None
+        else:
+            current.append(char)
+    return literals
+
+
+def _split_columns(select_list):
+    columns = []
+    depth = 0
+    current = []
+    for char in select_list:
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char == "," and depth == 0:
+            columns.append("".join(current).strip())
+            current = []
+            continue
+        current.append(char)
+    columns.append("".join(current).strip())
+    return columns
+
+
+def generate_result(sql_text, rows=20, total_found=None):
+    """
+    Default responder: returns (column names, rows) for statements producing a result set,
+    a list of those for statements producing several, None for statements answered with an OK packet.
+    """
+    statement = sql_text.strip()
+    upper = statement.upper()
+    if upper.startswith("SHOW META"):
+        total_found = rows if total_found is None else total_found
+        return ["Variable_name", "Value"], [
+            ("total", str(min(total_found, 1000))), ("total_found", str(total_found)), ("time", "0.001")
+        ]
+    if upper.startswith("SHOW PROFILE"):
+        return ["Status", "Duration", "Switches", "Percent"], [
+            ("init", "0.000010", "1", "10.00"), ("dict_setup", "0.000020", "1", "20.00"),
+            ("local_search", "0.000070", "2", "70.00"), ("total", "0.000100", "4", "100.00")
+        ]
+    if upper.startswith("SHOW PLAN"):
+        return ["Variable", "Value"], [
+            ("transformed_tree", "AND(\n  KEYWORD(fake, querypos=1),\n  KEYWORD(plan, querypos=2))")
+        ]
+    if upper.startswith("SHOW VARIABLES"):
+        return ["Variable_name", "Value"], [("sql_mode", "")]
+    if upper.startswith("SHOW"):
+        return ["Variable_name", "Value"], []
+    if upper.startswith("CALL SNIPPETS(("):
+        # the documents, with their first word highlighted
+        documents = _string_literals(statement[len("CALL SNIPPETS(("):])
+        return ["snippet"], [(re.sub(r"^(\w+)", r"<b>\1</b>", document, flags=re.U),) for document in documents]
+    if upper.startswith("CALL KEYWORDS("):
+        # words ending in '*' expand to three keywords, the others are lowercased;
+        # searchd returns every column as a string
+        text = _string_literals(statement[len("CALL KEYWORDS("):])[0]
+        result = []
+        for position, word in enumerate(text.split()):
+            if word.endswith("*"):
+                expansions = [(word[:-1] + suffix, docs) for suffix, docs in (("a", 9), ("b", 100), ("ab", 10))]
+            else:
+                expansions = [(word.lower(), 10)]
+            result.extend((str(position + 1), word, expansion, str(docs), str(2 * docs))
+                          for expansion, docs in expansions)
+        return ["qpos", "tokenized", "normalized", "docs", "hits"], result
+    if upper.startswith("CALL QSUGGEST("):
+        word = _string_literals(statement[len("CALL QSUGGEST("):])[0]
+        return ["suggest", "distance", "docs"], [(word + "s", 1, 10), (word[:-1], 1, 5)]
+    match = SELECT_RE.match(statement)
+    if not match:
+        return None
+    if FACET_RE.search(statement):
+        # one extra result set per FACET clause
+        clauses = FACET_RE.split(statement)
+        results = [generate_result(clauses[0], rows, total_found)]
+        for clause in clauses[1:]:
+            name = re.split(r"\s+ORDER\s+BY\s+|\s+LIMIT\s+", clause.strip(), flags=re.I)[0]
+            results.append(([name, "count(*)"], [(u"{0} {1}".format(name, index + 1), 10 - index)
+                                                 for index in range(min(rows, 10))]))
+        return results
+
+    names = []
+    for column in _split_columns(match.group(1)):
+        alias = re.split(r"\s+AS\s+", column, flags=re.I)
+        names.append(alias[-1].strip("`"))
+    offset, count = 0, rows
+    limit = LIMIT_RE.search(statement)
+    if limit:
+        if limit.group(2) is None:
+            count = min(rows, int(limit.group(1)))
+        else:
+            offset, count = int(limit.group(1)), min(rows, int(limit.group(2)))
+    result = []
+    for index in range(offset, offset + count):
+        row = []
+        for name in names:
+            lowered = name.lower()
+            if lowered == "id":
+                row.append(index + 1)
+            elif lowered.startswith(("weight", "count", "sum", "min", "max")):
+                row.append(1000 - index)
+            else:
+                row.append(u"{0} {1}".format(name, index + 1))
+        result.append(tuple(row))
+    return names, result
+
+
+class _Handler(socketserver.BaseRequestHandler):
+
+    def setup(self):
+        self.sequence = 0
+        self.buffer = b""
+
+    def _read(self, size):
+        while len(self.buffer) < size:
+            data = self.request.recv(65536)
+            if not data:
+                raise EOFError()
+            self.buffer += data
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+    def read_packet(self):
+        header = self._read(4)
+        length = struct.unpack("<I", header[:3] + b"\x00")[0]
+        self.sequence = bytearray(header)[3] + 1
+        return self._read(length)
+
+    def write_packets(self, payloads):
+        data = []
+        for payload in payloads:
+            data.append(struct.pack("<I", len(payload))[:3] + struct.pack("<B", self.sequence % 256) + payload)
+            self.sequence += 1
+        self.request.sendall(b"".join(data))
+
+    def ok_packet(self, status=SERVER_STATUS_AUTOCOMMIT):
+        return b"\x00" + _lenenc_int(0) + _lenenc_int(0) + struct.pack("<HH", status, 0)
+
+    def eof_packet(self, status=SERVER_STATUS_AUTOCOMMIT):
+        return b"\xfe" + struct.pack("<HH", 0, status)
+
+    def error_packet(self, message, code=1064):
+        return b"\xff" + struct.pack("<H", code) + b"#42000" + message.encode("utf8")
+
+    def result_packets(self, names, rows, status):
+        sample = rows[0] if rows else ()
+        packets = [_lenenc_int(len(names))]
+        for position, name in enumerate(names):
+            value = sample[position] if position < len(sample) else None
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                column_type, charset = TYPE_VAR_STRING, UTF8_GENERAL_CI
+            elif isinstance(value, float):
+                column_type, charset = TYPE_DOUBLE, BINARY_CHARSET
+            else:
+                column_type, charset = TYPE_LONGLONG, BINARY_CHARSET
+            packets.append(
+                _lenenc_str("def") + _lenenc_str("") + _lenenc_str("") + _lenenc_str("") +
+                _lenenc_str(name) + _lenenc_str(name) + b"\x0c" +
+                struct.pack("<HIBHB", charset, 255, column_type, 0, 0) + b"\x00\x00"
+            )
+        packets.append(self.eof_packet())
+        for row in rows:
+            packets.append(b"".join(b"\xfb" if value is None else _lenenc_str(value) for value in row))
+        packets.append(self.eof_packet(status))
+        return packets
+
+    def handshake(self):
+        salt = b"12345678abcdefghijkl"
+        payload = (
+            b"\x0a" + b"2.2.11-fake\x00" + struct.pack("<I", 1) + salt[:8] + b"\x00" +
+            struct.pack("<HBHH", CAPABILITIES & 0xffff, UTF8_GENERAL_CI, SERVER_STATUS_AUTOCOMMIT, CAPABILITIES >> 16) +
+            struct.pack("<B", len(salt) + 1) + b"\x00" * 10 + salt[8:] + b"\x00" + b"mysql_native_password\x00"
+        )
+        self.sequence = 0
+        self.write_packets([payload])
+        self.read_packet()
+        self.write_packets([self.ok_packet()])
+
+    def query(self, sql_text):
+        server = self.server.searchd
+        with server.lock:
+            server.queries += 1
+        statements = split_statements(sql_text)
+        packets = []
+        for position, statement in enumerate(statements):
+            server.record(statement)
+            if server.latency:
+                time.sleep(server.latency)
+            status = SERVER_STATUS_AUTOCOMMIT
+            if position < len(statements) - 1:
+                status |= SERVER_MORE_RESULTS_EXISTS
+            try:
+                result = server.responder(statement)
+            except Exception as e:
+                packets.append(self.error_packet(str(e)))
+                break
+            if result is None:
+                packets.append(self.ok_packet(status))
+                continue
+            if not isinstance(result, list):
+                result = [result]
+            for position_in_statement, (names, rows) in enumerate(result):
+                more = status
+                if position_in_statement < len(result) - 1:
+                    more |= SERVER_MORE_RESULTS_EXISTS
+                packets.extend(self.result_packets(names, rows, more))
+        self.write_packets(packets or [self.ok_packet()])
+
+    def handle(self):
+        try:
+            self.handshake()
+            while True:
+                packet = self.read_packet()
+                command = bytearray(packet)[0]
+                if command == COM_QUIT:
+                    return
+                elif command == COM_QUERY:
+                    self.query(packet[1:].decode("utf8"))
+                else:
+                    self.write_packets([self.ok_packet()])
+        except (EOFError, IOError):
+            pass
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class FakeSearchd(object):
+    """
+    responder: callable(statement) returning (column names, rows), a list of them for several
+    result sets, or None for an OK packet.
+    Defaults to generate_result with the given rows / total_found.
+    latency: seconds slept before answering each statement.
+    record: keep every statement received in statements, turn off for long running benchmarks.
+    queries counts the COM_QUERY packets received, i.e. the round trips.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, responder=None, rows=20, total_found=None, latency=0.0,
+                 record=True):
+        if responder is None:
+            def responder(statement):
+                return generate_result(statement, rows=rows, total_found=total_found)
+        self.responder = responder
+        self.latency = latency
+        self.recording = record
+        self.statements = []
+        self.queries = 0
+        self.lock = threading.Lock()
+        self.server = _Server((host, port), _Handler)
+        self.server.searchd = self
+        self.host, self.port = self.server.server_address[:2]
+        self.thread = None
+
+    def record(self, statement):
+        if not self.recording:
+            return
+        with self.lock:
+            self.statements.append(statement)
+
+    def url(self, driver="pymysql"):
+        return "sphinx+{0}://{1}:{2}".format(driver, self.host, self.port)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -1,19 +1,101 @@
-import re
+# searchd's default max_matches
+MAX_MATCHES = 1000
 
+# characters with a meaning in the Sphinx extended query syntax
+QUERY_SYNTAX_CHARS = u"\\@()|-!\"~/^$=<"
 
-SPECIAL_CHARS_RE = re.compile("([@()])")
+# escaping of a SphinxQL string literal, what the drivers' escape_string do
+STRING_ESCAPES = {
+    u"\0": u"\\0",
+    u"\n": u"\\n",
+    u"\r": u"\\r",
+    u"\x1a": u"\\Z",
+    u"'": u"\\'",
+    u'"': u'\\"',
+    u"\\": u"\\\\",
+}
 
 
-def escape_percent_char(match_string):
-    if match_string:
-        if "%" in match_string:
-            match_string = match_string.replace("%", "%%")
-    return match_string
+def _translation(mapping):
+    return dict((ord(char), replacement) for char, replacement in mapping.items())
 
 
-def escape_special_chars(match_string):
-    if match_string:
-        match_string = escape_percent_char(match_string)
-        if SPECIAL_CHARS_RE.search(match_string):
-            match_string = SPECIAL_CHARS_RE.sub(r"\\\\\1", match_string)
-    return match_string
+def _literal(text):
+    return u"".join(STRING_ESCAPES.get(char, char) for char in text)
+
+
+STRING_TABLE = _translation(STRING_ESCAPES)
+# text of a bound MATCH parameter: query syntax escaped once, the driver quotes the literal
+PARAM_TABLE = _translation(dict((char, u"\\" + char) for char in QUERY_SYNTAX_CHARS))
+# inline MATCH('...') text written as is: literal escaping, '%' doubled for the format paramstyle
+TEXT_TABLE = dict(STRING_TABLE)
+TEXT_TABLE[ord(u"%")] = u"%%"
+# inline MATCH('...') term searched in a single column: query syntax escaped, then literal escaping
+TERM_TABLE = dict(TEXT_TABLE)
+TERM_TABLE.update(_translation(dict((char, _literal(u"\\" + char)) for char in QUERY_SYNTAX_CHARS)))
+
+# joins batches so a whole list is translated in one call
+BATCH_SEPARATOR = u"\x1f"
+
+
+def _text(value):
+    if isinstance(value, bytes):
+        return value.decode("utf8")
+    return value
+
+
+def escape_string(value):
+    """Escape a string for a SphinxQL string literal, without the quotes"""
+    return _text(value).translate(STRING_TABLE) if value else value
+
+
+def escape_match_text(match_string):
+    """Escape full text query syntax written inline, e.g. func.match('@name adri%el')"""
+    return _text(match_string).translate(TEXT_TABLE) if match_string else match_string
+
+
+def escape_match_term(match_string):
+    """Escape a term written inline for a single column, query syntax operators are searched literally"""
+    return _text(match_string).translate(TERM_TABLE) if match_string else match_string
+
+
+def escape_match_param(match_string):
+    """Escape a MATCH term sent as a bound parameter; the driver takes care of quoting"""
+    return _text(match_string).translate(PARAM_TABLE) if match_string else match_string
+
+
+def escape_match_terms(match_strings, table=TERM_TABLE):
+    """
+    Escape many terms at once, e.g. a synonym list, with one of TERM_TABLE, TEXT_TABLE or PARAM_TABLE.
+    The terms are translated as one joined string unless one of them contains the separator.
+    """
+    match_strings = [_text(match_string) or u"" for match_string in match_strings]
+    joined = BATCH_SEPARATOR.join(match_strings)
+    if joined.count(BATCH_SEPARATOR) != max(len(match_strings) - 1, 0):
+        return [match_string.translate(table) for match_string in match_strings]
+    return joined.translate(table).split(BATCH_SEPARATOR) if match_strings else []
+
+
+def parse_meta(rows):
+    """Turn SHOW META rows into a dict, converting the well known counters"""
+    meta = {}
+    for name, value in rows:
+        if name in ("total", "total_found"):
+            value = int(value)
+        elif name == "time":
+            value = float(value)
+        meta[name] = value
+    return meta
+
+
+def budget_exceeded(meta, options):
+    """Names of the OPTION budgets (max_query_time, cutoff) a query ran into, judged from its SHOW META"""
+    exceeded = []
+    max_query_time = options.get("max_query_time")
+    if max_query_time and ("max_query_time" in meta.get("warning", "") or
+                           meta.get("time", 0) * 1000 >= max_query_time):
+        exceeded.append("max_query_time")
+    cutoff = options.get("cutoff")
+    if cutoff and meta.get("total_found", 0) >= cutoff:
+        exceeded.append("cutoff")
+    return tuple(exceeded)
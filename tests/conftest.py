@@ -0,0 +1,27 @@
+import pytest
+
+from sqlalchemy_sphinx.testing import FakeSearchd
+
+
+@pytest.fixture(scope="module")
+def start_searchd():
+    """Start FakeSearchd(**kwargs) servers that are stopped at the end of the module"""
+    servers = []
+
+    def start(**kwargs):
+        server = FakeSearchd(**kwargs).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.stop()
+
+
+@pytest.fixture(scope="module")
+def searchd(request, start_searchd):
+    """
+    FakeSearchd shared by the tests of a module, started with the module's searchd_options,
+    e.g. searchd_options = {"rows": 5, "responder": responder}
+    """
+    return start_searchd(**getattr(request.module, "searchd_options", {}))
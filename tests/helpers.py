@@ -0,0 +1,27 @@
+""" Models and stand-ins shared by the test modules"""
+
+from pymysql.converters import escape_item
+from sqlalchemy import Column, Integer, String
+from sqlalchemy.ext.declarative import declarative_base
+
+Base = declarative_base()
+
+
+class MockSphinxModel(Base):
+    __tablename__ = "mock_table"
+    id = Column(Integer, primary_key=True)
+    name = Column(String)
+    country = Column(String)
+
+
+class MockRTModel(Base):
+    __tablename__ = "rt_table"
+    id = Column(Integer, primary_key=True)
+    title = Column(String)
+
+
+class LiteralConnection(object):
+    """Stands in for a DBAPI connection when rendering literals without a server"""
+
+    def literal(self, value):
+        return escape_item(value, "utf8")
@@ -0,0 +1,65 @@
+import pytest
+
+from sqlalchemy import create_engine
+from sqlalchemy.exc import ArgumentError
+
+from sqlalchemy_sphinx.autocomplete import Autocomplete, keywords, qsuggest
+
+
+@pytest.fixture
+def autocomplete(searchd):
+    return Autocomplete(create_engine(searchd.url("pymysql")), "articles", expansion_limit=10)
+
+
+def calls(searchd):
+    return len([statement for statement in searchd.statements if statement.startswith("CALL")])
+
+
+def test_compile_calls():
+    dialect = create_engine("sphinx://").dialect
+    assert keywords("sphinx", "articles", stats=True).compile(dialect=dialect).string == \
+        "CALL KEYWORDS(%s, %s, %s AS stats)"
+    assert qsuggest("sphnix", "articles", limit=5).compile(dialect=dialect).string == \
+        "CALL QSUGGEST(%s, %s, %s AS limit)"
+    with pytest.raises(ArgumentError):
+        keywords("sphinx", "articles", **{"stats)": 1})
+
+
+def test_keywords_cached(searchd, autocomplete):
+    executed = calls(searchd)
+    rows = autocomplete.keywords("Sphinx Search")
+    assert [row.normalized for row in rows] == ["sphinx", "search"]
+    assert autocomplete.keywords("  sphinx   SEARCH ") == rows
+    assert calls(searchd) - executed == 1
+    assert (autocomplete.hits, autocomplete.misses) == (1, 1)
+
+
+def test_suggest(searchd, autocomplete):
+    assert [row.suggest for row in autocomplete.suggest("sphnix", limit=2)] == ["sphnixs", "sphni"]
+    autocomplete.suggest("sphnix", limit=2)
+    autocomplete.suggest("sphnix", limit=3)
+    assert autocomplete.misses == 2
+
+
+def test_complete_reuses_prefix(searchd, autocomplete):
+    executed = calls(searchd)
+    # ordered by docs, which searchd sends as strings: 100, 10, 9
+    assert autocomplete.complete("sph") == ["sphb", "sphab", "spha"]
+    assert searchd.statements[-1] == "CALL KEYWORDS('sph*', 'articles', 10 AS expansion_limit, " \
+                                     "0 AS fold_wildcards, 1 AS stats)"
+    assert autocomplete.complete("the sPHA") == ["sphab", "spha"]
+    assert autocomplete.complete("spha", limit=1) == ["sphab"]
+    assert autocomplete.complete("") == []
+    assert calls(searchd) - executed == 1
+    assert (autocomplete.misses, autocomplete.reused, autocomplete.hits) == (1, 1, 1)
+
+
+def test_incomplete_expansion_not_reused(searchd):
+    autocomplete = Autocomplete(create_engine(searchd.url("pymysql")), "articles", expansion_limit=3)
+    executed = calls(searchd)
+    autocomplete.complete("sph")
+    autocomplete.complete("spha")
+    assert calls(searchd) - executed == 2
+    autocomplete.invalidate()
+    autocomplete.complete("spha")
+    assert calls(searchd) - executed == 3
@@ -0,0 +1,157 @@
+import pytest
+
+from sqlalchemy import create_engine, func, and_
+
+from sqlalchemy_sphinx.batch import render_statement, fetch_result_sets, execute_batch, execute_facets
+from sqlalchemy_sphinx.dialect import facet
+from sqlalchemy_sphinx.pagination import Page, paginate
+from sqlalchemy_sphinx.utils import parse_meta
+from tests.helpers import LiteralConnection, MockSphinxModel
+
+searchd_options = {"rows": 5, "total_found": 42}
+
+
+class ResultCursor(object):
+    def __init__(self, result_sets):
+        self.result_sets = list(result_sets)
+        self.description, self.rows = self.result_sets.pop(0)
+
+    def fetchall(self):
+        return self.rows
+
+    def nextset(self):
+        if not self.result_sets:
+            return None
+        self.description, self.rows = self.result_sets.pop(0)
+        return True
+
+
+@pytest.fixture(scope="module", params=("sphinx://", "sphinx+pymysql://", "sphinx+cymysql://"))
+def sphinx_engine(request):
+    return create_engine(request.param)
+
+
+def test_render_inlines_params(sphinx_engine):
+    statement = MockSphinxModel.__table__.select().where(MockSphinxModel.id == 5).limit(10).offset(20)
+    sql_text = render_statement(sphinx_engine.dialect, LiteralConnection(), statement)
+    assert sql_text == "SELECT id, name, country \nFROM mock_table \nWHERE id = 5\n LIMIT 20, 10"
+
+
+def test_render_match_percent(sphinx_engine):
+    statement = MockSphinxModel.__table__.select().where(MockSphinxModel.name.match("100% adri'el"))
+    sql_text = render_statement(sphinx_engine.dialect, LiteralConnection(), statement)
+    assert sql_text == "SELECT id, name, country \nFROM mock_table \nWHERE MATCH('(@name 100% adri\\'el)')"
+
+
+def test_render_bound_match():
+    dialect = create_engine("sphinx+pymysql://", bind_match_params=True).dialect
+    statement = MockSphinxModel.__table__.select().where(func.match(MockSphinxModel.name, "@adri'el"))
+    sql_text = render_statement(dialect, LiteralConnection(), statement)
+    assert sql_text == "SELECT id, name, country \nFROM mock_table \nWHERE MATCH('(@name \\\\@adri\\'el)')"
+
+
+def test_fetch_result_sets():
+    cursor = ResultCursor([
+        ((("id",), ("weight",)), [(1, 10), (2, 5)]),
+        (None, []),
+        ((("country",), ("count(*)",)), [("US", 2)]),
+    ])
+    results = fetch_result_sets(cursor)
+    assert len(results) == 2
+    assert results[0][1].id == 2
+    assert results[1][0] == ("US", 2)
+    assert results[1][0].keys() == ["country", "count(*)"]
+
+
+def test_page_from_meta():
+    meta = parse_meta([("total", "45"), ("total_found", "1200"), ("time", "0.012"), ("keyword[0]", "adriel")])
+    page = Page([(1,), (2,)], 2, 20, meta)
+    assert page.total == 45
+    assert page.total_found == 1200
+    assert page.time == 0.012
+    assert page.pages == 3
+    assert page.has_next and page.has_prev
+    assert list(page) == [(1,), (2,)]
+    assert page.meta["keyword[0]"] == "adriel"
+
+
+@pytest.fixture(scope="module", params=(False, True), ids=("one_by_one", "multi_statements"))
+def searchd_engine(request, searchd):
+    return create_engine(searchd.url("pymysql"), multi_statements=request.param)
+
+
+def test_execute_batch(searchd, searchd_engine):
+    table = MockSphinxModel.__table__
+    # the first connection runs the dialect's setup queries
+    searchd_engine.connect().close()
+    queries = searchd.queries
+    first, second = execute_batch(searchd_engine, [
+        table.select().where(MockSphinxModel.name.match("adri'el")).limit(2),
+        table.select().where(MockSphinxModel.id == 3),
+    ])
+    assert [row.id for row in first] == [1, 2]
+    assert len(second) == 5
+    assert searchd.statements[-2:] == [
+        "SELECT id, name, country \nFROM mock_table \nWHERE MATCH('(@name adri\\'el)')\n LIMIT 0, 2",
+        "SELECT id, name, country \nFROM mock_table \nWHERE id = 3",
+    ]
+    assert searchd.queries - queries == (1 if searchd_engine.dialect.multi_statements else 2)
+
+
+def test_execute_batch_result_sets(searchd, searchd_engine):
+    table = MockSphinxModel.__table__
+    facets, updated, rows = execute_batch(searchd_engine, [
+        table.select().where(and_(MockSphinxModel.name.match("FACET; x"), facet(MockSphinxModel.country))),
+        table.update().where(MockSphinxModel.id == 1).values(country="US"),
+        table.select().where(MockSphinxModel.id == 3).limit(2),
+    ])
+    facet_rows, (countries,) = facets
+    assert len(facet_rows) == 5
+    assert countries[0] == ("country 1", 10)
+    assert updated == []
+    assert [row.id for row in rows] == [1, 2]
+    assert searchd.statements[-2] == "UPDATE mock_table SET country='US' WHERE id = 1"
+
+
+def test_paginate(searchd, searchd_engine):
+    page = paginate(searchd_engine, MockSphinxModel.__table__.select(), page=2, per_page=2)
+    assert [row.id for row in page] == [3, 4]
+    assert page.total_found == 42
+    assert page.pages == 21
+    assert searchd.statements[-1] == "SHOW META"
+    assert page.budget_exceeded == ()
+
+
+def test_paginate_budget(searchd):
+    engine = create_engine(searchd.url("pymysql"), default_options={"cutoff": 40}, derive_max_matches=True)
+    page = paginate(engine, MockSphinxModel.__table__.select(), page=2, per_page=2)
+    assert searchd.statements[-2].endswith("LIMIT 2, 2 OPTION cutoff=40, max_matches=1000")
+    assert page.pages == 21
+    assert page.budget_exceeded == ("cutoff",)
+
+
+def test_execute_facets(searchd_engine):
+    statement = MockSphinxModel.__table__.select().where(
+        and_(facet(MockSphinxModel.country, limit=2), facet(MockSphinxModel.name))
+    )
+    rows, (countries, names) = execute_facets(searchd_engine, statement)
+    assert len(rows) == 5
+    assert countries[0] == ("country 1", 10)
+    assert names[0].keys() == ["name", "count(*)"]
+
+
+@pytest.mark.parametrize("driver", ("pymysql", "cymysql"))
+def test_driver_round_trip(searchd, driver):
+    engine = create_engine(searchd.url(driver))
+    rows = engine.execute(MockSphinxModel.__table__.select().where(MockSphinxModel.name.match("adriel")))
+    assert [row.id for row in rows] == [1, 2, 3, 4, 5]
+    page = paginate(engine, MockSphinxModel.__table__.select(), per_page=2)
+    assert [row.id for row in page] == [1, 2]
+    assert page.total_found == 42
+
+
+def test_recording_off(start_searchd):
+    searchd = start_searchd(record=False)
+    create_engine(searchd.url("pymysql")).execute(MockSphinxModel.__table__.select()).fetchall()
+    assert searchd.statements == []
+    assert searchd.queries > 0
@@ -0,0 +1,121 @@
+import time
+
+import pytest
+
+from sqlalchemy import create_engine
+from sqlalchemy.exc import DBAPIError, InvalidRequestError
+
+from sqlalchemy_sphinx.buffer import WriteBehindBuffer
+from sqlalchemy_sphinx.testing import generate_result
+from tests.helpers import MockRTModel
+
+
+class Responder(object):
+    def __init__(self):
+        self.failures = 0
+
+    def __call__(self, statement):
+        if self.failures and statement.startswith("REPLACE"):
+            self.failures -= 1
+            raise Exception("searchd is rotating")
+        return generate_result(statement)
+
+
+responder = Responder()
+searchd_options = {"responder": responder}
+
+
+@pytest.fixture(scope="module")
+def engine(searchd):
+    return create_engine(searchd.url("pymysql"))
+
+
+def writes(searchd, executed):
+    return [statement for statement in searchd.statements[executed:] if statement.startswith(("REPLACE", "DELETE"))]
+
+
+def test_coalescing_and_flush(searchd, engine):
+    buffer = WriteBehindBuffer(engine, interval=60)
+    try:
+        executed = len(searchd.statements)
+        buffer.replace(MockRTModel, {"id": 1, "title": "first"})
+        buffer.replace(MockRTModel, MockRTModel(id=2, title="adri'el"))
+        buffer.replace(MockRTModel, {"id": 1, "title": "second"})
+        buffer.delete(MockRTModel, 3)
+        buffer.replace(MockRTModel, {"id": 3, "title": "third"})
+        buffer.delete(MockRTModel, 2)
+        assert (buffer.depth, buffer.coalesced) == (3, 3)
+        assert writes(searchd, executed) == []
+
+        assert buffer.flush() == 3
+        assert writes(searchd, executed) == [
+            "DELETE FROM rt_table WHERE id IN (2)",
+            "REPLACE INTO rt_table (id, title) VALUES (1, 'second'), (3, 'third')",
+        ]
+        assert (buffer.depth, buffer.flushes, buffer.flushed) == (0, 1, 3)
+        assert buffer.last_flush_latency > 0
+        assert buffer.flush() == 0
+    finally:
+        buffer.close()
+
+
+def test_background_triggers(searchd, engine):
+    buffer = WriteBehindBuffer(engine, max_size=2, interval=0.1)
+    try:
+        buffer.replace(MockRTModel, {"id": 1, "title": "size"})
+        buffer.replace(MockRTModel, {"id": 2, "title": "size"})
+        deadline = time.time() + 2
+        while buffer.flushed < 2 and time.time() < deadline:
+            time.sleep(0.01)
+        assert buffer.flushed == 2
+
+        buffer.replace(MockRTModel, {"id": 3, "title": "time"})
+        deadline = time.time() + 2
+        while buffer.flushed < 3 and time.time() < deadline:
+            time.sleep(0.01)
+        assert buffer.flushed == 3
+    finally:
+        buffer.close()
+
+
+def test_failed_flush_keeps_newer_writes(searchd, engine):
+    buffer = WriteBehindBuffer(engine, interval=60)
+    try:
+        buffer.replace(MockRTModel, {"id": 1, "title": "old"})
+        buffer.replace(MockRTModel, {"id": 2, "title": "kept"})
+        responder.failures = 1
+        with pytest.raises(DBAPIError):
+            buffer.flush()
+        assert (buffer.errors, buffer.depth) == (1, 2)
+        buffer.replace(MockRTModel, {"id": 1, "title": "new"})
+        executed = len(searchd.statements)
+        assert buffer.flush() == 2
+        assert writes(searchd, executed) == ["REPLACE INTO rt_table (id, title) VALUES (2, 'kept'), (1, 'new')"]
+    finally:
+        buffer.close()
+
+
+def test_failed_flush_retried_by_interval(searchd, engine):
+    buffer = WriteBehindBuffer(engine, interval=0.2)
+    try:
+        buffer.replace(MockRTModel, {"id": 1, "title": "retried"})
+        responder.failures = 1
+        with pytest.raises(DBAPIError):
+            buffer.flush()
+        deadline = time.time() + 2
+        while buffer.flushed < 1 and time.time() < deadline:
+            time.sleep(0.01)
+        assert (buffer.errors, buffer.flushed, buffer.depth) == (1, 1, 0)
+    finally:
+        buffer.close()
+
+
+def test_close_flushes(searchd, engine):
+    buffer = WriteBehindBuffer(engine, interval=60)
+    buffer.replace(MockRTModel, {"id": 1, "title": "closing"})
+    executed = len(searchd.statements)
+    assert buffer.close() == 1
+    assert writes(searchd, executed) == ["REPLACE INTO rt_table (id, title) VALUES (1, 'closing')"]
+    assert not buffer._thread.is_alive()
+    with pytest.raises(InvalidRequestError):
+        buffer.delete(MockRTModel, 1)
@@ -0,0 +1,132 @@
+import threading
+
+import pytest
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from sqlalchemy_sphinx.cache import MemoryBackend, ResultCache
+from tests.helpers import MockSphinxModel
+
+
+class FakeCursor(object):
+    def __init__(self, connection):
+        self.connection = connection
+        self.description = None
+        self.rows = []
+        self.rowcount = -1
+        self.lastrowid = None
+
+    def execute(self, statement, parameters=None):
+        self.connection.executed.append(statement)
+        if statement.startswith("SELECT id"):
+            self.description = (("id", 3, None, None, None, None, None),)
+            self.rows = [(1,), (2,)]
+        elif statement.startswith("SHOW"):
+            self.description = (("Variable_name", 253, None, None, None, None, None),
+                                ("Value", 253, None, None, None, None, None))
+            self.rows = [("sql_mode", "")]
+        else:
+            self.description = None
+            self.rows = []
+        self.rowcount = len(self.rows)
+
+    def fetchall(self):
+        rows, self.rows = self.rows, []
+        return rows
+
+    def fetchone(self):
+        return self.rows.pop(0) if self.rows else None
+
+    def nextset(self):
+        return None
+
+    def close(self):
+        pass
+
+
+class FakeConnection(object):
+    def __init__(self):
+        self.executed = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def character_set_name(self):
+        return "utf8"
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def cached_engine():
+    connection = FakeConnection()
+    engine = create_engine("sphinx+pymysql://", creator=lambda: connection, result_cache=ResultCache(ttl=60))
+    engine.connect().close()
+    del connection.executed[:]
+    return engine, connection
+
+
+def test_select_is_cached(cached_engine):
+    engine, connection = cached_engine
+    session = sessionmaker(bind=engine)()
+    query = session.query(MockSphinxModel.id).filter(MockSphinxModel.name.match("adriel"))
+    assert [row.id for row in query.all()] == [1, 2]
+    assert [row.id for row in query.all()] == [1, 2]
+    assert len(connection.executed) == 1
+    assert engine.dialect.result_cache.hits == 1
+    assert engine.dialect.result_cache.misses == 1
+
+
+def test_skip_cache(cached_engine):
+    engine, connection = cached_engine
+    session = sessionmaker(bind=engine)()
+    query = session.query(MockSphinxModel.id).execution_options(sphinx_cache=False)
+    query.all()
+    query.all()
+    assert len(connection.executed) == 2
+
+
+def test_write_invalidates(cached_engine):
+    engine, connection = cached_engine
+    statement = MockSphinxModel.__table__.select().with_only_columns([MockSphinxModel.id])
+    engine.execute(statement).fetchall()
+    engine.execute(MockSphinxModel.__table__.insert(sphinx_replace=True).values(id=3, name="x"))
+    engine.execute(statement).fetchall()
+    assert len(connection.executed) == 3
+    assert engine.dialect.result_cache.misses == 2
+
+
+def test_counters_threads(cached_engine):
+    engine, _ = cached_engine
+    statement = MockSphinxModel.__table__.select().with_only_columns([MockSphinxModel.id])
+
+    def search():
+        for _ in range(200):
+            engine.execute(statement).fetchall()
+
+    threads = [threading.Thread(target=search) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    result_cache = engine.dialect.result_cache
+    assert result_cache.hits + result_cache.misses == 1600
+
+
+def test_memory_backend_lru_and_ttl():
+    backend = MemoryBackend(max_size=2)
+    backend.set("a", 1, 60, ["idx"])
+    backend.set("b", 2, 60, ["other"])
+    backend.get("a")
+    backend.set("c", 3, 60, ["idx"])
+    assert backend.get("b") is None
+    assert backend.get("a") == 1
+    backend.invalidate("idx")
+    assert len(backend) == 0
+    backend.set("d", 4, -1, [])
+    assert backend.get("d") is None
@@ -0,0 +1,83 @@
+import array
+
+import pytest
+
+from sqlalchemy import create_engine, Column, Integer, BigInteger, Float, SmallInteger, String, func
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import sessionmaker
+
+from sqlalchemy_sphinx.columnar import fetch_columns, column_typecode, _infer_typecode, INT32, INT64, FLOAT64
+from sqlalchemy_sphinx.testing import generate_result
+
+Base = declarative_base()
+
+
+# column types picking the array typecodes
+class MockSphinxModel(Base):
+    __tablename__ = "mock_table"
+    id = Column(BigInteger, primary_key=True)
+    name = Column(String)
+    price = Column(Float)
+    rank = Column(Integer)
+
+
+def responder(statement):
+    if statement.startswith("SELECT id, price"):
+        return ["id", "price", "name", "weight()"], [(1, 1.5, u"one", 1000), (2, 2.5, u"two", 999)]
+    return generate_result(statement)
+
+
+searchd_options = {"responder": responder}
+
+
+@pytest.fixture(scope="module")
+def session(searchd):
+    return sessionmaker(bind=create_engine(searchd.url("pymysql")))()
+
+
+def test_column_typecode():
+    assert column_typecode(BigInteger()) == INT64
+    assert column_typecode(Integer()) == INT64
+    assert column_typecode(SmallInteger()) == INT32
+    assert column_typecode(Float()) == FLOAT64
+    assert column_typecode(String()) is None
+
+
+def test_fetch_columns_array(session):
+    query = session.query(MockSphinxModel.id, MockSphinxModel.price, MockSphinxModel.name, func.weight())
+    columns = fetch_columns(session.bind, query, use_numpy=False)
+    assert list(columns) == ["id", "price", "name", "weight()"]
+    assert columns["id"] == array.array(INT64, [1, 2])
+    assert columns["price"] == array.array(FLOAT64, [1.5, 2.5])
+    assert columns["name"] == [u"one", u"two"]
+    assert columns["weight()"] == array.array(INT64, [1000, 999])
+
+
+def test_fetch_columns_override(session):
+    query = session.query(MockSphinxModel.id, MockSphinxModel.price, MockSphinxModel.name, func.weight())
+    columns = fetch_columns(session.bind, query, use_numpy=False, typecodes={"weight()": INT32})
+    assert columns["weight()"].typecode == INT32
+
+
+def test_fetch_columns_empty(session):
+    query = session.query(MockSphinxModel.id, MockSphinxModel.rank).limit(0)
+    columns = fetch_columns(session.bind, query, use_numpy=False)
+    assert columns["id"] == array.array(INT64)
+    assert columns["rank"] == array.array(INT64)
+
+
+def test_infer_typecode():
+    assert _infer_typecode([1, 2]) == INT64
+    assert _infer_typecode([3, 2.5]) == FLOAT64
+    assert _infer_typecode([7, u"x"]) is None
+    assert _infer_typecode([1, None]) is None
+    assert _infer_typecode([]) is None
+
+
+def test_fetch_columns_numpy(session):
+    numpy = pytest.importorskip("numpy")
+    query = session.query(MockSphinxModel.id, MockSphinxModel.price, MockSphinxModel.name, func.weight())
+    columns = fetch_columns(session.bind, query)
+    assert columns["id"].dtype == numpy.int64
+    assert columns["price"].dtype == numpy.float64
+    assert list(columns["weight()"]) == [1000, 999]
@@ -6,6 +6,7 @@ from sqlalchemy_sphinx.dialect import SphinxDialect
 from sqlalchemy_sphinx.cymysql import Dialect as cymysqlDialect
 from sqlalchemy_sphinx.mysqldb import Dialect as mysqldbDialect
 from sqlalchemy_sphinx.pymysql import Dialect as pymysqlDialect
+from sqlalchemy_sphinx.replicas import ReplicaRouter
 
 
 @pytest.fixture(scope="module", params=(
@@ -39,6 +40,7 @@ def test_connection(sphinx_engine, dialect_class):
 
 def test_escape(sphinx_engine):
     assert sphinx_engine.dialect.escape_value("adri'el") == "adri\\'el"
+    assert sphinx_engine.dialect.escape_value(u"a\\b\"c\n\0") == u"a\\\\b\\\"c\\n\\0"
 
 
 def test_sanity_on_detects(sphinx_engine):
@@ -51,3 +53,67 @@ def test_sanity_on_detects(sphinx_engine):
     sphinx_engine.dialect.get_isolation_level(None)
     sphinx_engine.dialect.do_commit(None)
     sphinx_engine.dialect.do_begin(None)
+
+
+def test_multi_statements_flag(sphinx_engine):
+    client = __import__(sphinx_engine.dialect.dbapi.__name__ + ".constants.CLIENT").constants.CLIENT
+    args, opts = sphinx_engine.dialect.create_connect_args(sphinx_engine.url)
+    assert not opts["client_flag"] & client.MULTI_STATEMENTS
+    assert opts["client_flag"] & client.MULTI_RESULTS
+
+    engine = create_engine(sphinx_engine.url, multi_statements=True)
+    args, opts = engine.dialect.create_connect_args(engine.url)
+    assert opts["client_flag"] & client.MULTI_STATEMENTS
+    assert opts["client_flag"] & client.MULTI_RESULTS
+
+
+def test_replica_hosts(connection_url):
+    engine = create_engine(connection_url + "h1,h2:9307")
+    args, opts = engine.dialect.create_connect_args(engine.url)
+    assert "host" not in opts and "port" not in opts
+    assert engine.dialect.replica_router.replicas == [("h1", 9307), ("h2", 9307)]
+
+
+def test_replica_hosts_with_ports(connection_url):
+    engine = create_engine(connection_url + "/?hosts=h1:9306,h2:9307")
+    args, opts = engine.dialect.create_connect_args(engine.url)
+    assert "hosts" not in opts
+    assert engine.dialect.replica_router.replicas == [("h1", 9306), ("h2", 9307)]
+
+
+def test_single_host_has_no_router(sphinx_engine):
+    assert sphinx_engine.dialect.replica_router is None
+
+
+def test_replica_router():
+    router = ReplicaRouter([("h1", 9306), ("h2", 9306), ("h3", 9306)], tolerance=2.0)
+    router.observe(("h1", 9306), 0.010)
+    router.observe(("h2", 9306), 0.001)
+    router.observe(("h3", 9306), 0.002)
+    assert router.candidates() == [("h2", 9306), ("h3", 9306), ("h1", 9306)]
+    assert router.should_move(("h1", 9306))
+    assert not router.should_move(("h3", 9306))
+
+    router.eject(("h2", 9306))
+    assert router.candidates() == [("h3", 9306), ("h1", 9306)]
+    assert router.should_move(("h2", 9306))
+
+
+def test_replica_router_connect_latency():
+    router = ReplicaRouter([("h1", 9306), ("h2", 9306)], tolerance=2.0)
+    router.observe_connect(("h1", 9306), 0.0001)
+    router.observe_connect(("h2", 9306), 0.0002)
+    assert router.candidates() == [("h1", 9306), ("h2", 9306)]
+    # a query takes longer than a handshake, that alone must not move the connection
+    router.observe(("h1", 9306), 0.005)
+    assert not router.should_move(("h1", 9306))
+    assert router.candidates() == [("h2", 9306), ("h1", 9306)]
+    router.observe(("h2", 9306), 0.004)
+    assert not router.should_move(("h1", 9306))
+
+
+def test_replica_router_all_ejected():
+    router = ReplicaRouter([("h1", 9306), ("h2", 9306)], cooldown=10)
+    router.eject(("h2", 9306))
+    router.eject(("h1", 9306))
+    assert router.candidates() == [("h2", 9306), ("h1", 9306)]
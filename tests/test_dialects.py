@@ -1,11 +1,16 @@
 # -*- coding: utf-8 -*-
 import pytest
 
-from sqlalchemy import create_engine, Column, Integer, String, func, distinct, or_, not_, and_, column
+from sqlalchemy import (
+    create_engine, Column, Integer, String, func, distinct, or_, not_, and_, column, bindparam, select
+)
 from sqlalchemy.orm import sessionmaker, deferred
 from sqlalchemy.exc import CompileError
 from sqlalchemy.ext.declarative import declarative_base
 
+from sqlalchemy_sphinx.dialect import facet
+from sqlalchemy_sphinx.pagination import keyset_page
+
 
 @pytest.fixture(scope="module")
 def sphinx_connections():
@@ -186,6 +191,17 @@ class TestMatch:
         assert sql_text == "SELECT id \nFROM mock_table \n" \
                            "WHERE MATCH('(@name user \\\\)\\\\)\\\\)\\\\() (@country US)')"
 
+    def test_escape_query_operators(self, sphinx_engine, base_query, match_model_name):
+        query = base_query.filter(match_model_name('e-mail | "quoted" ~x'))
+        sql_text = query.statement.compile(sphinx_engine).string
+        assert sql_text == "SELECT id \nFROM mock_table \n" \
+                           "WHERE MATCH('(@name e\\\\-mail \\\\| \\\\\\\"quoted\\\\\\\" \\\\~x)')"
+
+    def test_func_match_keeps_query_operators(self, sphinx_engine, base_query):
+        query = base_query.filter(func.match('@name "adriel velazquez"~2 -US'))
+        sql_text = query.statement.compile(sphinx_engine).string
+        assert sql_text == "SELECT id \nFROM mock_table \nWHERE MATCH('@name \\\"adriel velazquez\\\"~2 -US')"
+
     def test_multiple_single_columns_match_with_filter(
             self, MockSphinxModel, sphinx_engine, base_query, match_model_name, match_model_country
     ):
@@ -305,6 +321,173 @@ class TestOptions:
         assert sql_text == "SELECT id \nFROM mock_table \nWHERE MATCH('(@country US)') OPTION max_matches=1"
 
 
+@pytest.fixture(scope="module")
+def budget_engine():
+    return create_engine("sphinx://", default_options={"max_query_time": 500, "ranker": "bm25"},
+                         derive_max_matches=True)
+
+
+class TestDefaultOptions:
+    def test_defaults_merged(self, MockSphinxModel, budget_engine, base_query):
+        query = base_query.filter(func.options(MockSphinxModel.ranker == "none"))
+        compiled = query.statement.compile(budget_engine)
+        assert compiled.string == "SELECT id \nFROM mock_table OPTION max_query_time=500, ranker=none"
+        assert compiled.sphinx_options == {"max_query_time": 500, "ranker": "none"}
+
+    def test_duplicate_options(self, MockSphinxModel, sphinx_engine, base_query):
+        query = base_query.filter(func.options(MockSphinxModel.max_matches == 1, MockSphinxModel.max_matches == 2))
+        sql_text = query.statement.compile(sphinx_engine).string
+        assert sql_text == "SELECT id \nFROM mock_table OPTION max_matches=2"
+
+    def test_derived_max_matches(self, MockSphinxModel, budget_engine, base_query):
+        sql_text = base_query.limit(20).offset(1990).statement.compile(budget_engine).string
+        assert sql_text == "SELECT id \nFROM mock_table\n LIMIT %s, %s OPTION max_query_time=500, ranker=bm25, " \
+                           "max_matches=2010"
+        # never below searchd's default of 1000
+        sql_text = base_query.limit(20).offset(40).statement.compile(budget_engine).string
+        assert sql_text.endswith("OPTION max_query_time=500, ranker=bm25")
+        query = base_query.filter(func.options(MockSphinxModel.max_matches == 1000)).limit(20)
+        sql_text = query.statement.compile(budget_engine).string
+        assert sql_text.endswith("OPTION max_query_time=500, ranker=bm25, max_matches=1000")
+
+    def test_statement_options(self, budget_engine, base_query):
+        statement = base_query.statement.execution_options(sphinx_options={"max_query_time": 50, "cutoff": 100})
+        sql_text = statement.compile(budget_engine).string
+        assert sql_text == "SELECT id \nFROM mock_table OPTION max_query_time=50, ranker=bm25, cutoff=100"
+
+    def test_derived_max_matches_keeps_engine_default(self, MockSphinxModel, base_query):
+        engine = create_engine("sphinx://", default_options={"max_matches": 5000}, derive_max_matches=True)
+        sql_text = base_query.limit(10).statement.compile(engine).string
+        assert sql_text.endswith("OPTION max_matches=5000")
+        sql_text = base_query.limit(10).offset(6000).statement.compile(engine).string
+        assert sql_text.endswith("OPTION max_matches=6010")
+
+    def test_no_derived_max_matches_with_group_by(self, MockSphinxModel, budget_engine, base_query):
+        query = base_query.group_by(MockSphinxModel.country).limit(10).offset(5000)
+        sql_text = query.statement.compile(budget_engine).string
+        assert sql_text.endswith("OPTION max_query_time=500, ranker=bm25")
+
+    @pytest.mark.parametrize("options", [
+        {"ranker": "bm25; SELECT 1"},
+        {"max_query_time": "500; SELECT 1"},
+        {"max_query_time; SELECT 1": 500},
+        {"field_weights": ["title=10) ; SELECT (1"]},
+        {"cutoff": True},
+    ])
+    def test_unsafe_options(self, base_query, options):
+        engine = create_engine("sphinx://", default_options=options)
+        with pytest.raises(CompileError):
+            base_query.statement.compile(engine)
+        statement = base_query.statement.execution_options(sphinx_options=options)
+        with pytest.raises(CompileError):
+            statement.compile(create_engine("sphinx://"))
+
+    def test_unsafe_option_clause(self, MockSphinxModel, sphinx_engine, base_query):
+        query = base_query.filter(func.options(MockSphinxModel.ranker == "none, max_matches=1"))
+        with pytest.raises(CompileError):
+            query.statement.compile(sphinx_engine)
+
+    def test_invalid_option(self, MockSphinxModel, sphinx_engine, base_query):
+        query = base_query.filter(func.options(MockSphinxModel.max_matches > 1))
+        with pytest.raises(CompileError):
+            query.statement.compile(sphinx_engine)
+
+
+class TestFacet:
+    def test_facet(self, MockSphinxModel, sphinx_engine, base_query, match_model_name):
+        query = base_query.filter(match_model_name("adriel"), func.facet(MockSphinxModel.country))
+        sql_text = query.statement.compile(sphinx_engine).string
+        assert sql_text == "SELECT id \nFROM mock_table \nWHERE MATCH('(@name adriel)') FACET country"
+
+    def test_facet_order_limit(self, MockSphinxModel, sphinx_engine, base_query, match_model_name):
+        query = base_query.filter(
+            match_model_name("adriel"),
+            facet(MockSphinxModel.country, order_by=func.count("*").desc(), limit=10),
+            facet(MockSphinxModel.name, MockSphinxModel.country),
+            func.options(MockSphinxModel.max_matches == 1)
+        ).limit(5)
+        sql_text = query.statement.compile(sphinx_engine).string
+        assert sql_text == "SELECT id \nFROM mock_table \nWHERE MATCH('(@name adriel)')\n LIMIT 0, 5 " \
+                           "OPTION max_matches=1 FACET country ORDER BY COUNT(*) DESC LIMIT 10 FACET name, country"
+
+    def test_subquery(self, MockSphinxModel, sphinx_engine, match_model_name):
+        inner = select([MockSphinxModel.id, MockSphinxModel.country]).where(and_(
+            match_model_name("adriel"), facet(MockSphinxModel.country), func.options(MockSphinxModel.max_matches == 1)
+        )).limit(50).alias("inner")
+        sql_text = select([inner.c.id]).select_from(inner).order_by(inner.c.id).limit(10).compile(sphinx_engine).string
+        assert sql_text.count("OPTION") == sql_text.count("FACET") == 1
+        assert sql_text.endswith("ORDER BY id\n LIMIT 0, 10 OPTION max_matches=1 FACET country")
+
+
+class TestKeyset:
+    def test_first_page(self, MockSphinxModel, sphinx_engine, base_query, match_model_name):
+        query = keyset_page(base_query.filter(match_model_name("adriel")), MockSphinxModel.id, batch_size=100)
+        sql_text = query.statement.compile(sphinx_engine).string
+        assert sql_text == "SELECT id \nFROM mock_table \nWHERE MATCH('(@name adriel)') ORDER BY id ASC\n LIMIT 0, 100"
+
+    def test_next_page(self, MockSphinxModel, sphinx_engine, base_query, match_model_name):
+        query = base_query.filter(match_model_name("adriel")).order_by(MockSphinxModel.country)
+        query = keyset_page(query, MockSphinxModel.id, last_id=500, batch_size=5000)
+        sql_text = query.statement.compile(sphinx_engine).string
+        assert sql_text == "SELECT id \nFROM mock_table \nWHERE MATCH('(@name adriel)') AND id > %s " \
+                           "ORDER BY id ASC\n LIMIT 0, 5000 OPTION max_matches=5000"
+
+
+class TestBoundParams:
+    @pytest.fixture(scope="module")
+    def bound_engine(self):
+        return create_engine("sphinx://", bind_match_params=True)
+
+    def test_match_is_bound(self, bound_engine, base_query, match_model_name):
+        compiled = base_query.filter(match_model_name("adri'el")).statement.compile(bound_engine)
+        assert compiled.string == "SELECT id \nFROM mock_table \nWHERE MATCH(%s)"
+        assert compiled.params["match_1"] == "(@name adri'el)"
+
+    def test_match_special_chars(self, bound_engine, base_query, match_model_name, match_model_country):
+        query = base_query.filter(match_model_name("@user (x) 100%"), match_model_country("US"))
+        compiled = query.statement.compile(bound_engine)
+        assert compiled.params["match_1"] == "(@name \\@user \\(x\\) 100%) (@country US)"
+
+    def test_func_match_all(self, bound_engine, base_query):
+        compiled = base_query.filter(func.match("@name adri%el")).statement.compile(bound_engine)
+        assert compiled.string == "SELECT id \nFROM mock_table \nWHERE MATCH(%s)"
+        assert compiled.params["match_1"] == "@name adri%el"
+
+    def test_same_shape_same_sql(self, bound_engine, base_query, match_model_name):
+        first = base_query.filter(match_model_name("adriel")).statement.compile(bound_engine)
+        second = base_query.filter(match_model_name("velazquez")).statement.compile(bound_engine)
+        assert first.string == second.string
+        assert second.params["match_1"] == "(@name velazquez)"
+
+    def test_execution_params(self, MockSphinxModel, bound_engine, base_query):
+        query = base_query.filter(MockSphinxModel.name.match(bindparam("q")))
+        compiled = query.statement.compile(bound_engine)
+        assert compiled.construct_params({"q": "adriel"})["match_1"] == "(@name adriel)"
+
+    def test_options_are_bound(self, MockSphinxModel, bound_engine, base_query, match_model_country):
+        query = base_query.filter(
+            match_model_country("US"),
+            func.options(MockSphinxModel.max_matches == 1, MockSphinxModel.field_weights == ["title=10"])
+        ).limit(10).offset(20)
+        compiled = query.statement.compile(bound_engine)
+        assert compiled.string == "SELECT id \nFROM mock_table \nWHERE MATCH(%s)\n LIMIT %s, %s " \
+                                  "OPTION max_matches=%s, field_weights=(title=10)"
+        assert [compiled.params[name] for name in compiled.positiontup] == ["(@country US)", 20, 10, 1]
+
+    def test_compiled_cache(self, MockSphinxModel, base_query, searchd):
+        engine = create_engine(searchd.url("pymysql"), bind_match_params=True)
+        cache = {}
+        query = base_query.filter(MockSphinxModel.name.match(bindparam("q"))).statement
+        with engine.connect() as connection:
+            cached = connection.execution_options(compiled_cache=cache)
+            cached.execute(query, q="adriel").fetchall()
+            cached.execute(query, q="velazquez").fetchall()
+        engine.dispose()
+        assert len(cache) == 1
+        assert searchd.statements[-2:] == ["SELECT id \nFROM mock_table \nWHERE MATCH('(@name adriel)')",
+                                           "SELECT id \nFROM mock_table \nWHERE MATCH('(@name velazquez)')"]
+
+
 class TestSelectSanity:
     def test_group_by(self, MockSphinxModel, sphinx_engine, base_query, match_model_name):
         query = base_query.filter(match_model_name("adriel")).group_by(MockSphinxModel.country)
@@ -0,0 +1,137 @@
+import threading
+import time
+
+import pytest
+
+from sqlalchemy import select
+from sqlalchemy.exc import ArgumentError
+
+from sqlalchemy_sphinx.hedging import HedgedSearch
+from sqlalchemy_sphinx.testing import generate_result
+from tests.helpers import MockSphinxModel
+
+
+def slow_select(statement):
+    if statement.startswith("SELECT"):
+        time.sleep(0.5)
+    return generate_result(statement, rows=3)
+
+
+@pytest.fixture(scope="module")
+def slow(start_searchd):
+    return start_searchd(responder=slow_select)
+
+
+@pytest.fixture(scope="module")
+def fast(start_searchd):
+    return start_searchd(rows=3)
+
+
+def search_statement(text):
+    return select([MockSphinxModel.id]).where(MockSphinxModel.name.match(text))
+
+
+def prefer(replicas, first, second):
+    for _ in range(20):
+        replicas.router.observe(first.url("pymysql"), 0.0)
+        replicas.router.observe(second.url("pymysql"), 1.0)
+
+
+def test_needs_two_replicas(fast):
+    with pytest.raises(ArgumentError):
+        HedgedSearch([fast.url("pymysql")])
+
+
+def test_hedge_wins(slow, fast):
+    replicas = HedgedSearch([slow.url("pymysql"), fast.url("pymysql")], delay=0.05)
+    try:
+        start = time.time()
+        rows = replicas.execute(search_statement("hedged"))
+        assert time.time() - start < 0.4
+        assert [row.id for row in rows] == [1, 2, 3]
+        assert (replicas.requests, replicas.hedges_sent, replicas.hedges_won) == (1, 1, 1)
+        assert "MATCH('(@name hedged)')" in fast.statements[-1]
+    finally:
+        replicas.dispose()
+
+
+def test_fast_primary_is_not_hedged(slow, fast):
+    replicas = HedgedSearch([fast.url("pymysql"), slow.url("pymysql")], delay=0.3)
+    try:
+        executed = len(slow.statements)
+        assert len(replicas.execute(search_statement("primary"))) == 3
+        assert replicas.hedges_sent == 0
+        assert len(slow.statements) == executed
+    finally:
+        replicas.dispose()
+
+
+def test_budget(start_searchd, fast):
+    # SELECTs on the gated replica only answer once the gate is opened, so every hedge is due
+    gate = threading.Event()
+
+    def gated_select(statement):
+        if statement.startswith("SELECT"):
+            gate.wait(5)
+        return generate_result(statement, rows=3)
+
+    gated = start_searchd(responder=gated_select)
+    replicas = HedgedSearch([gated.url("pymysql"), fast.url("pymysql")], delay=0.0, max_tokens=1.0, budget=0.0)
+    try:
+        prefer(replicas, gated, fast)
+        replicas.execute(search_statement("budget"))
+        assert (replicas.hedges_sent, replicas.hedges_won) == (1, 1)
+
+        prefer(replicas, gated, fast)
+        pending = replicas.executor.submit(replicas.execute, search_statement("budget"))
+        deadline = time.time() + 2
+        while not replicas.hedges_skipped and time.time() < deadline:
+            time.sleep(0.01)
+        gate.set()
+        assert len(pending.result(timeout=2)) == 3
+        assert (replicas.hedges_sent, replicas.hedges_skipped) == (1, 1)
+    finally:
+        gate.set()
+        replicas.dispose()
+
+
+def test_query_error_does_not_eject(start_searchd, fast):
+    def failing_select(statement):
+        if statement.startswith("SELECT"):
+            raise ValueError("index mock_table: syntax error")
+        return generate_result(statement, rows=3)
+
+    failing = start_searchd(responder=failing_select)
+    replicas = HedgedSearch([failing.url("pymysql"), fast.url("pymysql")], delay=0.3)
+    try:
+        prefer(replicas, failing, fast)
+        assert len(replicas.execute(search_statement("error"))) == 3
+        assert replicas.hedges_won == 1
+        assert failing.url("pymysql") not in replicas.router.ejected
+    finally:
+        replicas.dispose()
+
+
+def test_cancel_with_kill(slow, fast):
+    replicas = HedgedSearch([slow.url("pymysql"), fast.url("pymysql")], delay=0.05, cancel="kill")
+    try:
+        replicas.execute(search_statement("killed"))
+        deadline = time.time() + 2
+        while not any(statement.startswith("KILL ") for statement in slow.statements) and time.time() < deadline:
+            time.sleep(0.05)
+        assert any(statement.startswith("KILL ") for statement in slow.statements)
+    finally:
+        replicas.dispose()
+
+
+def test_derived_delay(fast):
+    replicas = HedgedSearch([fast.url("pymysql"), fast.url("pymysql")])
+    try:
+        assert replicas.hedge_delay() == 0.05
+        replicas.latencies.extend([0.01] * 95 + [0.2] * 5)
+        assert replicas.hedge_delay() == 0.2
+        replicas.latencies.clear()
+        replicas.latencies.extend([0.01] * 96 + [0.2] * 4)
+        assert replicas.hedge_delay() == 0.01
+    finally:
+        replicas.dispose()
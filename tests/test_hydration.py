@@ -0,0 +1,82 @@
+import pytest
+
+from sqlalchemy import create_engine, Column, Integer, String, func
+from sqlalchemy.exc import ArgumentError
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import sessionmaker
+
+from sqlalchemy_sphinx.hydration import hydrate
+
+Base = declarative_base()
+
+searchd_options = {"rows": 3}
+
+
+class Article(Base):
+    __tablename__ = "article"
+    id = Column(Integer, primary_key=True)
+    title = Column(String)
+
+
+class Tagging(Base):
+    __tablename__ = "tagging"
+    article_id = Column(Integer, primary_key=True)
+    tag = Column(String, primary_key=True)
+
+
+@pytest.fixture(scope="module")
+def primary_engine(tmpdir_factory):
+    engine = create_engine("sqlite:///{0}".format(tmpdir_factory.mktemp("hydration").join("primary.db")))
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    session.add_all([Article(id=id_, title="article {0}".format(id_)) for id_ in range(1, 21)])
+    session.commit()
+    return engine
+
+
+@pytest.fixture
+def db_session(primary_engine):
+    session = sessionmaker(bind=primary_engine)()
+    yield session
+    session.close()
+
+
+def test_hydrate_order_and_weights(db_session):
+    hits = [(5, 900), (2, 800), (99, 700), (7, 600)]
+    result = hydrate(hits, Article, db_session)
+    assert [(article.id, weight) for article, weight in result] == [(5, 900), (2, 800), (7, 600)]
+
+
+def test_hydrate_ids_only(db_session):
+    assert [(article.id, weight) for article, weight in hydrate([(3,), (1,)], Article, db_session)] == [
+        (3, None), (1, None)]
+
+
+def test_hydrate_parallel_chunks(db_session):
+    hits = [(id_, 100 - id_) for id_ in range(20, 0, -1)]
+    result = hydrate(hits, Article, db_session, chunk_size=3, max_workers=4)
+    assert [article.id for article, _ in result] == list(range(20, 0, -1))
+    assert all(article in db_session for article, _ in result)
+
+
+def test_hydrate_reuses_loaded_rows(db_session):
+    first = db_session.query(Article).get(4)
+    cache = {}
+    result = hydrate([(4, 1), (6, 1)], Article, db_session, cache=cache)
+    assert result[0][0] is first
+    assert set(cache) == {6}
+    other = sessionmaker(bind=db_session.bind)()
+    assert hydrate([(6, 1)], Article, other, cache=cache)[0][0] is cache[6]
+
+
+def test_hydrate_sphinx_query(db_session, searchd):
+    sphinx_session = sessionmaker(bind=create_engine(searchd.url("pymysql")))()
+    search = sphinx_session.query(Article.id, func.weight()).filter(Article.title.match("article"))
+    result = hydrate(search, Article, db_session)
+    assert [(article.title, weight) for article, weight in result] == [
+        ("article 1", 1000), ("article 2", 999), ("article 3", 998)]
+
+
+def test_hydrate_composite_key(db_session):
+    with pytest.raises(ArgumentError):
+        hydrate([], Tagging, db_session)
@@ -0,0 +1,90 @@
+import logging
+import threading
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from sqlalchemy_sphinx.cache import ResultCache
+from sqlalchemy_sphinx.instrumentation import Instrumentation, HistogramSink, LoggingSink, QueryStats
+from tests.helpers import MockSphinxModel
+
+searchd_options = {"rows": 5}
+
+
+def instrumented_session(searchd, **kwargs):
+    collected = []
+    instrumentation = Instrumentation(sinks=[collected.append], **kwargs)
+    engine = create_engine(searchd.url("pymysql"), instrumentation=instrumentation,
+                           result_cache=kwargs.pop("result_cache", None))
+    return sessionmaker(bind=engine)(), collected
+
+
+def test_query_stats(searchd):
+    session, collected = instrumented_session(searchd)
+    rows = session.query(MockSphinxModel.id, MockSphinxModel.name).filter(
+        MockSphinxModel.name.match("adriel")).limit(3).all()
+    assert len(rows) == 3
+    stats = collected[-1]
+    assert stats.statement.startswith("SELECT")
+    assert stats.rows == 3
+    assert stats.bytes == 3 * 8 + sum(len(name) for _, name in rows)
+    assert stats.prepare_time > 0
+    assert stats.execute_time > 0
+    assert stats.server_time is None
+    assert stats.total_time == stats.prepare_time + stats.execute_time + stats.fetch_time
+
+
+def test_show_meta(searchd):
+    session, collected = instrumented_session(searchd, show_meta=True)
+    session.query(MockSphinxModel.id).filter(MockSphinxModel.name.match("adriel")).all()
+    assert collected[-1].server_time == 0.001
+    assert searchd.statements[-1] == "SHOW META"
+
+
+def test_cache_hits_skip_show_meta(searchd):
+    collected = []
+    engine = create_engine(searchd.url("pymysql"), result_cache=ResultCache(),
+                           instrumentation=Instrumentation(sinks=[collected.append], show_meta=True))
+    query = sessionmaker(bind=engine)().query(MockSphinxModel.id).filter(MockSphinxModel.name.match("cached"))
+    query.all()
+    executed = len(searchd.statements)
+    query.all()
+    assert len(searchd.statements) == executed
+    assert [stats.cached for stats in collected[-2:]] == [False, True]
+    assert collected[-1].rows == 5
+    assert collected[-1].server_time is None
+
+
+def test_slow_query_log(searchd, caplog):
+    session, collected = instrumented_session(searchd, slow_query_threshold=0)
+    with caplog.at_level(logging.WARNING, logger="sqlalchemy_sphinx.instrumentation"):
+        session.query(MockSphinxModel.id).filter(MockSphinxModel.name.match("slow")).all()
+    assert "Slow SphinxQL" in caplog.text
+    assert "MATCH('(@name slow)')" in caplog.text
+
+
+def test_sinks(caplog):
+    stats = QueryStats("SELECT id FROM mock_table", ())
+    stats.execute_time = 0.02
+    histogram = HistogramSink(buckets=(0.01, 0.1))
+    histogram(stats)
+    assert histogram.counts == [0, 1, 0]
+    with caplog.at_level(logging.DEBUG, logger="sqlalchemy_sphinx.instrumentation"):
+        LoggingSink()(stats)
+    assert "SELECT id FROM mock_table" in caplog.text
+
+
+def test_histogram_threads():
+    stats = QueryStats("SELECT id FROM mock_table", ())
+    histogram = HistogramSink(buckets=(0.01, 0.1))
+
+    def record():
+        for _ in range(1000):
+            histogram(stats)
+
+    threads = [threading.Thread(target=record) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert histogram.counts == [8000, 0, 0]
@@ -0,0 +1,114 @@
+import pytest
+
+from sqlalchemy import create_engine
+from sqlalchemy.exc import ProgrammingError
+from sqlalchemy.orm import sessionmaker
+
+from sqlalchemy_sphinx.cache import ResultCache
+from sqlalchemy_sphinx.profiling import Profiler, ShapeSink, parse_plan, parse_profile
+from sqlalchemy_sphinx.testing import generate_result
+from tests.helpers import MockSphinxModel
+
+searchd_options = {"rows": 5}
+
+
+def profiled_session(searchd, **kwargs):
+    collected = []
+    result_cache = kwargs.pop("result_cache", None)
+    profiler = Profiler(sinks=[collected.append], **kwargs)
+    engine = create_engine(searchd.url("pymysql"), profiler=profiler, result_cache=result_cache)
+    return sessionmaker(bind=engine)(), collected
+
+
+def test_parse_plan():
+    plan = parse_plan("AND(\n  OR(KEYWORD(i, querypos=1), KEYWORD(me, querypos=2)),\n  KEYWORD(my, querypos=3))")
+    assert plan.kind == "AND"
+    assert [node.kind for node in plan.walk()] == ["AND", "OR", "KEYWORD", "KEYWORD", "KEYWORD"]
+    keyword = plan.children[1]
+    assert keyword.words == ["my"]
+    assert dict(keyword.attributes) == {"querypos": "3"}
+    assert plan.shape() == "AND(OR(KEYWORD, KEYWORD), KEYWORD)"
+    assert repr(keyword) == "KEYWORD(my, querypos=3)"
+    assert parse_plan("") is None
+    with pytest.raises(ValueError):
+        parse_plan("AND(KEYWORD(a, querypos=1)")
+
+
+def test_parse_profile():
+    stages, total = parse_profile([("init", "0.000010", "1", "10.00"), ("total", "0.000100", "1", "100.00")])
+    assert list(stages.items()) == [("init", 0.00001)]
+    assert total == 0.0001
+
+
+def test_execution_option(searchd):
+    session, collected = profiled_session(searchd)
+    query = session.query(MockSphinxModel.id).filter(MockSphinxModel.name.match("adriel"))
+    query.all()
+    assert collected == []
+
+    result = session.execute(query.statement.execution_options(sphinx_profile=True))
+    assert len(result.fetchall()) == 5
+    profile = result.profile
+    assert collected == [profile]
+    assert searchd.statements[-5] == "SET profiling=1"
+    assert searchd.statements[-4].startswith("SELECT")
+    assert searchd.statements[-3:] == ["SHOW PROFILE", "SHOW PLAN", "SET profiling=0"]
+    assert list(profile.stages) == ["init", "dict_setup", "local_search"]
+    assert profile.total_time == 0.0001
+    assert profile.shape == "AND(KEYWORD, KEYWORD)"
+    assert profile.statement.startswith("SELECT")
+
+
+def test_session_option_and_profiling_reset(searchd):
+    session, collected = profiled_session(searchd)
+    session.connection(execution_options={"sphinx_profile": True})
+    executed = len(searchd.statements)
+    for name in ("first", "second"):
+        session.query(MockSphinxModel.id).filter(MockSphinxModel.name.match(name)).all()
+    statements = searchd.statements[executed:]
+    assert statements.count("SET profiling=1") == 2
+    assert statements.count("SET profiling=0") == 2
+    assert statements.count("SHOW PLAN") == 2
+    assert len(collected) == 2
+
+
+def failing_select(statement):
+    if "broken" in statement:
+        raise ValueError("syntax error")
+    return generate_result(statement, rows=5)
+
+
+def test_profiling_reset_after_error(start_searchd):
+    failing = start_searchd(responder=failing_select)
+    session, collected = profiled_session(failing)
+    query = session.query(MockSphinxModel.id).execution_options(sphinx_profile=True)
+    with pytest.raises(ProgrammingError):
+        query.filter(MockSphinxModel.name.match("broken")).all()
+    assert "broken" in failing.statements[-2]
+    assert failing.statements[-1] == "SET profiling=0"
+    assert collected == []
+
+
+def test_sampling(searchd):
+    session, collected = profiled_session(searchd, sample_rate=1.0)
+    session.query(MockSphinxModel.id).filter(MockSphinxModel.name.match("sampled")).all()
+    assert len(collected) == 1
+    session.query(MockSphinxModel.id).filter(MockSphinxModel.name.match("sampled")).execution_options(
+        sphinx_profile=False).all()
+    assert len(collected) == 1
+
+
+def test_cache_hits_are_not_profiled(searchd):
+    session, collected = profiled_session(searchd, sample_rate=1.0, result_cache=ResultCache())
+    query = session.query(MockSphinxModel.id).filter(MockSphinxModel.name.match("cached"))
+    assert query.all() == query.all()
+    assert len(collected) == 1
+
+
+def test_shape_sink():
+    sink = ShapeSink()
+    timings = (("AND(KEYWORD)", 0.1), ("AND(KEYWORD)", 0.2), ("KEYWORD", 0.05))
+    profiles = [type("Profile", (), {"shape": shape, "total_time": time}) for shape, time in timings]
+    for profile in profiles:
+        sink(profile)
+    assert sink.slowest(1) == [("AND(KEYWORD)", 2, pytest.approx(0.3))]
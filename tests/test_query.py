@@ -0,0 +1,58 @@
+import pytest
+
+from sqlalchemy import create_engine, Column, Integer, String, func
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import sessionmaker, deferred
+
+from sqlalchemy_sphinx.query import SphinxQuery
+
+Base = declarative_base()
+
+searchd_options = {"rows": 3}
+
+
+# attribute keys that differ from the column names, and a deferred column
+class MockSphinxModel(Base):
+    __tablename__ = "mock_table"
+    id = Column(Integer, primary_key=True)
+    full_name = Column("name", String)
+    country = deferred(Column(String))
+
+
+@pytest.fixture(scope="module")
+def session(searchd):
+    return sessionmaker(bind=create_engine(searchd.url("pymysql")), query_cls=SphinxQuery)()
+
+
+def test_tuples(session):
+    rows = session.query(MockSphinxModel.id, MockSphinxModel.full_name).limit(2).tuples()
+    assert list(rows) == [(1, u"name 1"), (2, u"name 2")]
+
+
+def test_hits(session):
+    hits = session.query(MockSphinxModel, func.weight()).filter(MockSphinxModel.full_name.match("adriel")).hits()
+    assert len(hits) == 3
+    assert hits[0].full_name == u"name 1"
+    assert hits[0].id == 1
+    assert hits[0].weight == 1000
+    assert not hasattr(hits[0], "country")
+    assert len(session.identity_map) == 0
+
+
+def test_labels(session):
+    hit = session.query(MockSphinxModel.id.label("doc"), MockSphinxModel.full_name).hits()[0]
+    # the fake searchd fills columns from their alias
+    assert (hit.doc, hit.full_name) == (u"doc 1", u"name 1")
+
+
+def test_hits_execution_option(session):
+    query = session.query(MockSphinxModel).execution_options(sphinx_hits=True)
+    assert query.first() == (u"name 1", 1)
+    assert [hit.id for hit in query] == [1, 2, 3]
+    assert len(session.identity_map) == 0
+
+
+def test_instances_by_default(session):
+    instances = session.query(MockSphinxModel).all()
+    assert isinstance(instances[0], MockSphinxModel)
+    session.expunge_all()
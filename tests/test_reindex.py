@@ -0,0 +1,127 @@
+import re
+
+import pytest
+
+from sqlalchemy import create_engine, Column, Integer, String
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import Session
+
+from sqlalchemy_sphinx.cache import ResultCache
+from sqlalchemy_sphinx.reindex import FileCheckpoint, ReindexPipeline, partition_ids
+from sqlalchemy_sphinx.testing import generate_result
+
+Base = declarative_base()
+
+
+class Article(Base):
+    __tablename__ = "articles"
+    id = Column(Integer, primary_key=True)
+    title = Column(String)
+    internal = Column(String)
+
+
+class RTArticle(Base):
+    __tablename__ = "rt_articles"
+    id = Column(Integer, primary_key=True)
+    title = Column(String)
+
+
+class Responder(object):
+    def __init__(self):
+        self.fail_on = None
+
+    def __call__(self, statement):
+        if self.fail_on is not None and self.fail_on in statement:
+            self.fail_on = None
+            raise Exception("searchd went away")
+        return generate_result(statement)
+
+
+responder = Responder()
+searchd_options = {"responder": responder}
+
+
+@pytest.fixture(scope="module")
+def source(tmpdir_factory):
+    engine = create_engine("sqlite:///{0}".format(tmpdir_factory.mktemp("reindex").join("source.db")))
+    Base.metadata.create_all(engine)
+    engine.execute(Article.__table__.insert(), [{"id": i, "title": "title {0}".format(i), "internal": "x"}
+                                                for i in range(1, 101)])
+    return engine
+
+
+def writes(searchd, executed):
+    return [statement for statement in searchd.statements[executed:] if not statement.startswith(("SET", "SHOW"))]
+
+
+def replaced_ids(statements):
+    return sorted(int(id_) for statement in statements if statement.startswith("REPLACE")
+                  for id_ in re.findall(r"\((\d+), ", statement))
+
+
+def pipeline(source, searchd, sphinx_engine=None, **kwargs):
+    query = Session().query(Article.id, Article.title)
+    sphinx_engine = sphinx_engine or create_engine(searchd.url("pymysql"))
+    return ReindexPipeline(source, query, Article.id, sphinx_engine, RTArticle, "rt_articles_staging", **kwargs)
+
+
+def test_partition_ids():
+    assert partition_ids(1, 10, 3) == [[1, 5], [5, 9], [9, 11]]
+    assert partition_ids(5, 5, 4) == [[5, 6]]
+    assert partition_ids(None, None, 4) == []
+
+
+def test_reindex(source, searchd):
+    reported = []
+    executed = len(searchd.statements)
+    progress = pipeline(source, searchd, partitions=4, max_workers=4, chunk_size=10,
+                        progress=lambda progress: reported.append(progress.rows)).run()
+    statements = writes(searchd, executed)
+    assert statements[0] == "TRUNCATE RTINDEX rt_articles_staging"
+    assert statements[-1] == "ATTACH INDEX rt_articles_staging TO RTINDEX rt_articles WITH TRUNCATE"
+    assert replaced_ids(statements) == list(range(1, 101))
+    assert all(statement.startswith("REPLACE INTO rt_articles_staging (id, title) VALUES")
+               for statement in statements[1:-1])
+    assert (progress.rows, progress.partitions_done, progress.partitions) == (100, 4, 4)
+    assert sorted(reported)[-1] == 100 and len(reported) == 12
+    assert progress.rows_per_second > 0
+
+
+def test_resume_from_checkpoint(source, searchd, tmpdir):
+    checkpoint = FileCheckpoint(str(tmpdir.join("checkpoint.json")))
+    responder.fail_on = "(35, "
+    executed = len(searchd.statements)
+    with pytest.raises(DBAPIError):
+        pipeline(source, searchd, partitions=2, max_workers=1, chunk_size=10, checkpoint=checkpoint).run()
+    state = checkpoint.load()
+    assert state["ranges"] == [[1, 51], [51, 101]]
+    assert state["positions"]["0"] == 30
+    # the second partition may have started on the freed worker before the run stopped
+    written = list(range(1, 31)) + list(range(51, state["positions"].get("1", 50) + 1))
+    # the failed chunk reached searchd too
+    assert replaced_ids(writes(searchd, executed)) == sorted(written + list(range(31, 41)))
+
+    executed = len(searchd.statements)
+    progress = pipeline(source, searchd, partitions=2, max_workers=1, chunk_size=10, checkpoint=checkpoint).run()
+    statements = writes(searchd, executed)
+    assert not any(statement.startswith("TRUNCATE") for statement in statements)
+    assert replaced_ids(statements) == sorted(set(range(31, 101)) - set(written))
+    assert statements[-1].startswith("ATTACH INDEX")
+    assert progress.rows == 100 - len(written)
+    assert checkpoint.load() is None
+
+
+def test_swap_invalidates_result_cache(source, searchd):
+    result_cache = ResultCache()
+    sphinx_engine = create_engine(searchd.url("pymysql"), result_cache=result_cache)
+    search = RTArticle.__table__.select().where(RTArticle.title.match("title"))
+    sphinx_engine.execute(search).fetchall()
+    sphinx_engine.execute(search).fetchall()
+    assert result_cache.hits == 1
+
+    pipeline(source, searchd, sphinx_engine=sphinx_engine, partitions=1, chunk_size=50).run()
+    executed = len(searchd.statements)
+    sphinx_engine.execute(search).fetchall()
+    assert result_cache.hits == 1
+    assert searchd.statements[executed:] == [str(search.compile(sphinx_engine))]
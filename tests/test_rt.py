@@ -0,0 +1,40 @@
+import pytest
+
+from sqlalchemy import create_engine, Column, Integer, String, Table, MetaData
+
+from sqlalchemy_sphinx.rt import iter_bulk_statements
+from tests.helpers import LiteralConnection, MockRTModel
+
+
+@pytest.fixture(scope="module")
+def sphinx_engine():
+    return create_engine("sphinx://")
+
+
+def test_replace_compiles(sphinx_engine):
+    statement = MockRTModel.__table__.insert(sphinx_replace=True).values(id=1, title="adriel")
+    assert str(statement.compile(sphinx_engine)) == "REPLACE INTO rt_table (id, title) VALUES (%s, %s)"
+
+
+def test_bulk_dicts(sphinx_engine):
+    rows = ({"id": i, "title": "adri'el"} for i in range(5))
+    statements = list(iter_bulk_statements(sphinx_engine.dialect, LiteralConnection(), MockRTModel, rows, chunk_size=2))
+    assert [count for _, count in statements] == [2, 2, 1]
+    assert statements[0][0] == "REPLACE INTO rt_table (id, title) VALUES (0, 'adri\\'el'), (1, 'adri\\'el')"
+
+
+def test_bulk_instances_insert(sphinx_engine):
+    rows = [MockRTModel(id=1, title="a"), MockRTModel(id=2, title="b")]
+    statements = list(iter_bulk_statements(sphinx_engine.dialect, LiteralConnection(), MockRTModel, rows,
+                                           replace=False, columns=["id"]))
+    assert statements == [("INSERT INTO rt_table (id) VALUES (1), (2)", 2)]
+
+
+def test_bulk_packet_size(sphinx_engine):
+    table = Table("rt_table", MetaData(), Column("id", Integer), Column("title", String))
+    rows = [{"id": i, "title": "x" * 100} for i in range(10)]
+    statements = list(iter_bulk_statements(sphinx_engine.dialect, LiteralConnection(), table, rows,
+                                           max_packet_size=400))
+    assert sum(count for _, count in statements) == 10
+    assert all(len(sql_text) <= 400 for sql_text, count in statements)
+    assert len(statements) > 1
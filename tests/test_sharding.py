@@ -0,0 +1,77 @@
+import time
+
+import pytest
+
+from sqlalchemy import event, func, desc, select
+from sqlalchemy.exc import ArgumentError
+from sqlalchemy.util import lightweight_named_tuple
+
+from sqlalchemy_sphinx.sharding import ShardedSearch, merge_meta, merge_rows, order_keys, timeout_connect_args
+from sqlalchemy_sphinx.testing import generate_result
+from tests.helpers import MockSphinxModel
+
+Row = lightweight_named_tuple("result", ["id", "weight"])
+
+
+def test_order_keys():
+    weight = func.weight().label("weight")
+    statement = select([MockSphinxModel.id, weight]).order_by(weight.desc(), MockSphinxModel.id)
+    assert order_keys(statement) == [("weight", True), ("id", False)]
+
+
+def test_order_keys_textual_and_expression():
+    statement = select([MockSphinxModel.id, func.weight().label("w")]).order_by(desc("w"))
+    assert order_keys(statement) == [("w", True)]
+    statement = select([MockSphinxModel.id, func.weight().label("w")]).order_by(func.weight().desc())
+    assert order_keys(statement) == [("w", True)]
+
+
+def test_order_keys_unselected_expression():
+    with pytest.raises(ArgumentError):
+        order_keys(select([MockSphinxModel.id]).order_by(func.weight()))
+
+
+def test_merge_rows():
+    shard_1 = [Row((1, 30)), Row((4, 10))]
+    shard_2 = [Row((2, 20)), Row((3, 10))]
+    merged = merge_rows([shard_1, shard_2], [("weight", True), ("id", False)], offset=1, limit=2)
+    assert [row.id for row in merged] == [2, 3]
+
+
+def test_merge_meta():
+    meta = merge_meta([{"total": 10, "total_found": 100, "time": 0.1}, {"total": 5, "total_found": 5, "time": 0.3}])
+    assert meta == {"total": 15, "total_found": 105, "time": 0.3}
+
+
+def hung_select(statement):
+    if statement.startswith("SELECT"):
+        time.sleep(2)
+    return generate_result(statement, rows=3)
+
+
+def test_timeout_connect_args():
+    assert timeout_connect_args("sphinx+pymysql://localhost:9306", 0.25) == {
+        "connect_timeout": 0.25, "read_timeout": 0.25, "write_timeout": 0.25}
+    assert timeout_connect_args("sphinx+cymysql://localhost:9306", 0.25) == {"connect_timeout": 0.25}
+
+
+def test_hung_shard_times_out(start_searchd):
+    hung, healthy = start_searchd(responder=hung_select), start_searchd(rows=3)
+    shards = ShardedSearch([hung.url("pymysql"), healthy.url("pymysql")], timeout=0.3, max_workers=1)
+    statement = select([MockSphinxModel.id]).where(MockSphinxModel.name.match("sharded")).limit(3)
+    invalidated = []
+    event.listen(shards.engines[0].pool, "invalidate", lambda *args: invalidated.append(args))
+    try:
+        for _ in range(3):
+            start = time.time()
+            result = shards.execute(statement)
+            assert time.time() - start < 1
+            assert result.partial
+            assert list(result.errors) == [hung.url("pymysql")]
+            assert len(result.rows) == 3
+        # the socket timeout ended the hung search and its connection was discarded
+        time.sleep(0.5)
+        assert shards.engines[0].pool.checkedout() == 0
+        assert invalidated
+    finally:
+        shards.dispose()
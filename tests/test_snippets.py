@@ -0,0 +1,55 @@
+import pytest
+
+from sqlalchemy import create_engine
+from sqlalchemy.exc import ArgumentError
+
+from sqlalchemy_sphinx.dialect import snippets
+from sqlalchemy_sphinx.snippets import call_snippets
+
+
+def snippet_calls(searchd):
+    return len([statement for statement in searchd.statements if statement.startswith("CALL SNIPPETS")])
+
+
+def test_compile_snippets():
+    compiled = snippets(["first", "second"], "articles", "@title x", exact=True, limit=80, around=True).compile(
+        dialect=create_engine("sphinx://").dialect)
+    assert compiled.string == "CALL SNIPPETS((%s, %s), %s, %s, %s AS around, %s AS limit)"
+    params = compiled.construct_params()
+    assert [params[name] for name in compiled.positiontup] == ["first", "second", "articles", "\\@title x", 1, 80]
+
+
+def test_invalid_snippets():
+    with pytest.raises(ArgumentError):
+        snippets([], "articles", "x")
+    with pytest.raises(ArgumentError):
+        snippets(["doc"], "articles", "x", **{"limit=1; DROP": 1})
+
+
+def test_call_snippets(searchd):
+    engine = create_engine(searchd.url("pymysql"))
+    documents = [u"first doc", u"it's second", u"100% third", u"fourth"]
+    assert call_snippets(engine, documents, "articles", "doc", limit=80) == [
+        u"<b>first</b> doc", u"<b>it</b>'s second", u"<b>100</b>% third", u"<b>fourth</b>"]
+    assert searchd.statements[-1].startswith("CALL SNIPPETS(('first doc', 'it\\'s second'")
+
+
+def test_call_snippets_chunks(searchd):
+    engine = create_engine(searchd.url("pymysql"))
+    documents = [u"doc{0} text".format(position) for position in range(25)]
+    executed = snippet_calls(searchd)
+    excerpts = call_snippets(engine, documents, "articles", "text", chunk_size=4, max_workers=3)
+    assert excerpts == [u"<b>doc{0}</b> text".format(position) for position in range(25)]
+    assert snippet_calls(searchd) - executed == 7
+    assert call_snippets(engine, [], "articles", "text") == []
+
+
+def test_call_snippets_packet_size(searchd):
+    engine = create_engine(searchd.url("pymysql"))
+    executed = snippet_calls(searchd)
+    connection = engine.connect()
+    try:
+        call_snippets(connection, [u"a" * 100] * 3, "articles", "a", max_packet_size=450)
+    finally:
+        connection.close()
+    assert snippet_calls(searchd) - executed == 2
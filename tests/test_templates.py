@@ -0,0 +1,56 @@
+import pytest
+
+from sqlalchemy import create_engine, Integer, bindparam, func, select
+from sqlalchemy.exc import ArgumentError
+from sqlalchemy.orm import Session
+
+from sqlalchemy_sphinx.templates import QueryTemplate
+from tests.helpers import MockSphinxModel
+
+searchd_options = {"rows": 5}
+
+
+@pytest.fixture(scope="module")
+def engine(searchd):
+    return create_engine(searchd.url("pymysql"))
+
+
+def test_template(searchd, engine):
+    query = Session().query(MockSphinxModel.id, MockSphinxModel.name, func.weight()).filter(
+        MockSphinxModel.name.match(bindparam("text")), MockSphinxModel.country == bindparam("country")
+    ).limit(bindparam("limit", type_=Integer))
+    template = QueryTemplate(engine, query)
+    assert list(template.slots) == ["country", "limit", "text"]
+    assert "MATCH(%(match_1)s)" in template.sql
+
+    hits = template.execute(text="it's (adriel)", country="US", limit=2)
+    assert [(hit.id, hit.name, hit.weight) for hit in hits] == [(1, u"name 1", 1000), (2, u"name 2", 999)]
+    assert searchd.statements[-1] == (
+        "SELECT id, name, weight() AS weight_1 \nFROM mock_table "
+        "\nWHERE MATCH('(@name it\\'s \\\\(adriel\\\\))') AND country = 'US'\n LIMIT 0, 2"
+    )
+    assert len(template.execute(text="other", country="DE", limit=3)) == 3
+
+
+def test_literal_match_and_offset(searchd, engine):
+    statement = select([MockSphinxModel.id]).where(MockSphinxModel.name.match("fixed")).limit(
+        bindparam("limit")).offset(bindparam("offset"))
+    template = QueryTemplate(engine, statement)
+    assert sorted(template.slots) == ["limit", "offset"]
+    assert [hit.id for hit in template.execute(limit=2, offset=1)] == [2, 3]
+    assert searchd.statements[-1].endswith("WHERE MATCH('(@name fixed)')\n LIMIT 1, 2")
+
+
+def test_slot_errors(engine):
+    template = QueryTemplate(engine, select([MockSphinxModel.id]).where(
+        MockSphinxModel.name.match(bindparam("text"))))
+    with pytest.raises(ArgumentError):
+        template.execute()
+    with pytest.raises(ArgumentError):
+        template.execute(text="a", txet="b")
+
+
+def test_compiles_like_the_engine(engine):
+    query = Session().query(MockSphinxModel.id).filter(MockSphinxModel.name.match("adriel"))
+    assert "MATCH('(@name adriel)')" in str(query.statement.compile(engine))
+    assert "MATCH(%(match_1)s)" in QueryTemplate(engine, query).sql
@@ -0,0 +1,33 @@
+from sqlalchemy_sphinx.utils import (
+    escape_match_term, escape_match_text, escape_match_param, escape_match_terms, PARAM_TABLE, parse_meta,
+    budget_exceeded
+)
+
+
+def test_escape_match_text():
+    assert escape_match_text(u"@name adri'el 5%") == u"@name adri\\'el 5%%"
+    assert escape_match_text(b"adriel") == u"adriel"
+    assert escape_match_text(None) is None
+
+
+def test_escape_match_terms():
+    terms = [u"e-mail", u"@user", u"50%", u"x\x1f(y)", u""]
+    expected = [escape_match_term(term) for term in terms]
+    assert expected[:3] == [u"e\\\\-mail", u"\\\\@user", u"50%%"]
+    assert escape_match_terms(terms) == expected
+    assert escape_match_terms(terms[:3]) == expected[:3]
+    assert escape_match_terms(terms[:2], PARAM_TABLE) == [escape_match_param(term) for term in terms[:2]]
+    assert escape_match_terms([]) == []
+
+
+def test_parse_meta():
+    assert parse_meta([("total", "3"), ("total_found", "42"), ("time", "0.010"), ("keyword[0]", "x")]) == {
+        "total": 3, "total_found": 42, "time": 0.01, "keyword[0]": "x"}
+
+
+def test_budget_exceeded():
+    meta = {"total": 1000, "total_found": 5000, "time": 0.12}
+    assert budget_exceeded(meta, {}) == ()
+    assert budget_exceeded(meta, {"max_query_time": 100, "cutoff": 5000}) == ("max_query_time", "cutoff")
+    assert budget_exceeded(dict(meta, warning="query time exceeded max_query_time"), {"max_query_time": 500}) == (
+        "max_query_time",)